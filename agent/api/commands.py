@@ -8,7 +8,8 @@ from fastapi import APIRouter, HTTPException
 
 from ..core.database import (get_expired_rentals, mark_rental_terminated,
                              store_rental_in_db)
-from ..core.state import agent_instance_id, websocket_connections
+from ..core import state
+from ..core.state import agent_instance_id
 from ..deployment import docker_manager
 from .schemas import InstanceData, InstanceID, RentalRequest, RentalResponse
 
@@ -17,9 +18,9 @@ logger = logging.getLogger(__name__)
 
 async def send_live_update(message: str, instance_uuid: str = None):
     """Sends a live status update to the server via WebSocket."""
-    if agent_instance_id in websocket_connections:
+    if state.current_ws is not None:
         try:
-            await websocket_connections[agent_instance_id].send_json({
+            await state.current_ws.send_json({
                 "status": "live_update",
                 "agent_id": agent_instance_id,
                 "instance_uuid": instance_uuid,
@@ -30,7 +31,7 @@ async def send_live_update(message: str, instance_uuid: str = None):
 
 async def send_rental_update(instance_uuid: str, status: str, message: str, container_id: str = None):
     """Send rental status update via WebSocket."""
-    if agent_instance_id in websocket_connections:
+    if state.current_ws is not None:
         try:
             update_data = {
                 "instance_uuid": instance_uuid,
@@ -41,7 +42,7 @@ async def send_rental_update(instance_uuid: str, status: str, message: str, cont
             if container_id:
                 update_data["container_id"] = container_id
             
-            await websocket_connections[agent_instance_id].send_json(update_data)
+            await state.current_ws.send_json(update_data)
         except Exception as e:
             logger.error(f"Failed to send rental update: {e}")
 
@@ -49,7 +50,7 @@ async def send_rental_ready_update(instance_uuid: str, container_info: dict, ren
     """Send final ready status with connection info."""
     import socket
     
-    if agent_instance_id in websocket_connections:
+    if state.current_ws is not None:
         try:
             # Get host IP
             host_ip = socket.gethostbyname(socket.gethostname())
@@ -86,7 +87,7 @@ async def send_rental_ready_update(instance_uuid: str, container_info: dict, ren
                 "access_info": access_info
             }
             
-            await websocket_connections[agent_instance_id].send_json(update_data)
+            await state.current_ws.send_json(update_data)
         except Exception as e:
             logger.error(f"Failed to send ready update: {e}")
 
@@ -192,12 +193,15 @@ async def find_available_gpu(gpu_type: str) -> Optional[str]:
     """Find an available GPU of the specified type."""
     try:
         # Import here to avoid circular imports
-        from ..core.hardware import get_gpu_info
+        from ..core.hardware import collect_gpu_metrics, get_gpu_info
         
-        gpus = await get_gpu_info()
-        for gpu in gpus:
-            if gpu.get('name') == gpu_type and gpu.get('memory_used_mb', 0) == 0:
-                return gpu.get('uuid')
+        # Both are blocking NVML / nvidia-smi reads; run them off the loop together
+        gpu, metrics = await asyncio.gather(
+            asyncio.to_thread(get_gpu_info),
+            asyncio.to_thread(collect_gpu_metrics)
+        )
+        if gpu.get('name') == gpu_type and metrics.get('vram_used_mb', 0) == 0:
+            return gpu.get('hardware_uuid')
         
         return None
     except Exception as e:
@@ -1,27 +1,122 @@
 # host-agent/agent/core/database.py
 import asyncio
+import copy
 import json
 import logging
 import os
+import tempfile
+import time
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional
 
 import asyncpg
 import yaml
 
+# libyaml-backed loader/dumper when PyYAML was built with it
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
 logger = logging.getLogger(__name__)
 
 # Database connection
 db_pool = None
 
+# gpu_status rows are only written by this agent, so reads are served from
+# memory for a short while and every local write drops the cached copy
+GPU_STATUS_CACHE_TTL = 2.0
+_gpu_status_cache: Dict[str, tuple] = {}
+_gpu_status_generation = 0
+
+def _invalidate_gpu_status():
+    global _gpu_status_generation
+    _gpu_status_cache.clear()
+    _gpu_status_generation += 1
+
+# Parsed config per path, keyed by the file's (mtime_ns, size) so an edit forces a re-parse
+_config_cache: Dict[str, tuple] = {}
+
+# Config file location, resolved on first use
+_config_path = None
+
+def get_config_path() -> str:
+    """Return the config file in use."""
+    global _config_path
+    if _config_path is None:
+        _config_path = "/etc/taolie-host-agent/config.yaml"
+        if not os.path.exists(_config_path):
+            _config_path = "config.yaml"  # Fallback for development
+    return _config_path
+
+def _config_stamp(config_path: str) -> tuple:
+    stat = os.stat(config_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
 def load_config():
-    """Load configuration from YAML file."""
-    config_path = "/etc/taolie-host-agent/config.yaml"
-    if not os.path.exists(config_path):
-        config_path = "config.yaml"  # Fallback for development
+    """Load configuration from YAML file, reusing the last parse while the file is unchanged."""
+    config_path = get_config_path()
+    stamp = _config_stamp(config_path)
+    
+    cached = _config_cache.get(config_path)
+    if cached is None or cached[0] != stamp:
+        with open(config_path, 'r') as f:
+            cached = (stamp, yaml.load(f, Loader=SafeLoader))
+        _config_cache[config_path] = cached
+    
+    # Callers modify their config, so each gets its own copy
+    return copy.deepcopy(cached[1])
+
+def _dump_config(config: Dict[str, Any], f):
+    yaml.dump(config, f, Dumper=SafeDumper, default_flow_style=False)
+    f.flush()
+    os.fsync(f.fileno())
+
+def _replace_config(config: Dict[str, Any], config_path: str, stat: os.stat_result) -> bool:
+    """Write config to a temp file beside config_path and rename it over the original.
+
+    Returns False (leaving the original alone) if the replacement can't be given
+    the original's owner and group, e.g. when not running as root.
+    """
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(config_path) or '.', delete=False) as f:
+        try:
+            _dump_config(config, f)
+        except Exception:
+            os.unlink(f.name)
+            raise
+    try:
+        tmp_stat = os.stat(f.name)
+        if hasattr(os, 'chown') and (tmp_stat.st_uid, tmp_stat.st_gid) != (stat.st_uid, stat.st_gid):
+            os.chown(f.name, stat.st_uid, stat.st_gid)
+        os.chmod(f.name, stat.st_mode & 0o777)
+    except PermissionError:
+        os.unlink(f.name)
+        return False
+    os.replace(f.name, config_path)
+    return True
+
+def save_config(config: Dict[str, Any]):
+    """Write configuration back to the YAML file and refresh the cached parse.
+
+    The file is replaced atomically (temp file + rename, keeping its owner,
+    group and permissions), so a crash mid-write can't leave a truncated
+    config. Where that isn't possible (the directory isn't writable, or the
+    owner can't be kept) the file is rewritten in place instead.
+    """
+    config_path = get_config_path()
+    stat = os.stat(config_path)
+    
+    # Nothing to write if the file still holds exactly this config
+    cached = _config_cache.get(config_path)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size) and cached[1] == config:
+        return
     
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+    if not (os.access(os.path.dirname(config_path) or '.', os.W_OK)
+            and _replace_config(config, config_path, stat)):
+        with open(config_path, 'w') as f:
+            _dump_config(config, f)
+    _config_cache[config_path] = (_config_stamp(config_path), copy.deepcopy(config))
 
 async def init_database():
     """Initialize PostgreSQL database connection with retry logic."""
@@ -274,7 +369,8 @@ async def store_gpu_status(gpu_data: Dict[str, Any]):
                 gpu_data['status'],
                 gpu_data['is_healthy']
             )
-            
+        
+        _invalidate_gpu_status()
         logger.info(f"GPU status stored/updated for {gpu_data['gpu_uuid']}")
         
     except Exception as e:
@@ -344,6 +440,27 @@ async def update_deployment_status(deployment_id: str, status: str, **kwargs):
     except Exception as e:
         logger.error(f"Failed to update deployment status: {e}")
 
+async def bulk_update_deployment_status(deployment_ids: list, status: str):
+    """Set the same status on several deployments in one statement."""
+    if db_pool is None:
+        logger.warning("Database not initialized, cannot update deployments")
+        return
+    
+    if not deployment_ids:
+        return
+    
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.execute('''
+                UPDATE deployments SET status = $2, updated_at = NOW()
+                WHERE deployment_id = ANY($1::text[])
+            ''', list(deployment_ids), status)
+    
+        logger.info(f"{len(deployment_ids)} deployments status updated to {status}")
+    
+    except Exception as e:
+        logger.error(f"Failed to update deployment statuses: {e}")
+
 async def get_expired_deployments():
     """Get all expired deployments that need to be terminated."""
     if db_pool is None:
@@ -353,9 +470,7 @@ async def get_expired_deployments():
     try:
         async with db_pool.acquire() as conn:
             rows = await conn.fetch('''
-                SELECT d.deployment_id, d.container_id, d.gpu_id,
-                       d.start_time, d.duration_minutes, d.user_id,
-                       g.gpu_uuid, g.public_ip
+                SELECT d.deployment_id, d.container_id
                 FROM deployments d
                 JOIN gpu_status g ON d.gpu_id = g.gpu_id
                 WHERE d.status = 'running'
@@ -420,29 +535,41 @@ async def store_gpu_metrics(gpu_id: str, metrics: Dict[str, Any], deployment_id:
     
     try:
         async with db_pool.acquire() as conn:
-            await conn.execute('''
-                INSERT INTO gpu_metrics (
-                    gpu_id, deployment_id, gpu_utilization,
-                    vram_used_mb, vram_total_mb, temperature_celsius,
-                    power_draw_watts, fan_speed_percent,
-                    container_status, uptime_seconds
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-            ''', 
-                gpu_id,
-                deployment_id,
-                metrics.get('gpu_utilization'),
-                metrics.get('vram_used_mb'),
-                metrics.get('vram_total_mb'),
-                metrics.get('temperature_celsius'),
-                metrics.get('power_draw_watts'),
-                metrics.get('fan_speed_percent'),
-                metrics.get('container_status'),
-                metrics.get('uptime_seconds')
-            )
+            await _insert_gpu_metrics(conn, gpu_id, metrics, deployment_id)
             
     except Exception as e:
         logger.error(f"Failed to store GPU metrics: {e}")
 
+_INSERT_GPU_METRICS = '''
+    INSERT INTO gpu_metrics (
+        gpu_id, deployment_id, gpu_utilization,
+        vram_used_mb, vram_total_mb, temperature_celsius,
+        power_draw_watts, fan_speed_percent,
+        container_status, uptime_seconds, timestamp
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+'''
+
+def _gpu_metrics_row(gpu_id: str, metrics: Dict[str, Any], deployment_id: str = None,
+                     sampled_at: datetime = None) -> tuple:
+    # Rows are written in batches, so NOW() would stamp them all with the flush time
+    return (
+        gpu_id,
+        deployment_id,
+        metrics.get('gpu_utilization'),
+        metrics.get('vram_used_mb'),
+        metrics.get('vram_total_mb'),
+        metrics.get('temperature_celsius'),
+        metrics.get('power_draw_watts'),
+        metrics.get('fan_speed_percent'),
+        metrics.get('container_status'),
+        metrics.get('uptime_seconds'),
+        sampled_at or datetime.now()
+    )
+
+async def _insert_gpu_metrics(conn, gpu_id: str, metrics: Dict[str, Any], deployment_id: str = None,
+                              sampled_at: datetime = None):
+    await conn.execute(_INSERT_GPU_METRICS, *_gpu_metrics_row(gpu_id, metrics, deployment_id, sampled_at))
+
 async def store_health_check(gpu_id: str, health_data: Dict[str, Any]):
     """Store GPU health check results."""
     if db_pool is None:
@@ -451,40 +578,52 @@ async def store_health_check(gpu_id: str, health_data: Dict[str, Any]):
     
     try:
         async with db_pool.acquire() as conn:
-            await conn.execute('''
-                INSERT INTO gpu_health_history (
-                    gpu_id, health_status, driver_responsive,
-                    temperature_normal, power_normal, no_ecc_errors,
-                    fan_operational, error_count, error_message
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            ''', 
-                gpu_id,
-                health_data['health_status'],
-                health_data.get('driver_responsive'),
-                health_data.get('temperature_normal'),
-                health_data.get('power_normal'),
-                health_data.get('no_ecc_errors'),
-                health_data.get('fan_operational'),
-                health_data.get('error_count', 0),
-                health_data.get('error_message')
-            )
+            await _insert_health_check(conn, gpu_id, health_data)
             
     except Exception as e:
         logger.error(f"Failed to store health check: {e}")
 
+async def _insert_health_check(conn, gpu_id: str, health_data: Dict[str, Any]):
+    await conn.execute('''
+        INSERT INTO gpu_health_history (
+            gpu_id, health_status, driver_responsive,
+            temperature_normal, power_normal, no_ecc_errors,
+            fan_operational, error_count, error_message
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ''', 
+        gpu_id,
+        health_data['health_status'],
+        health_data.get('driver_responsive'),
+        health_data.get('temperature_normal'),
+        health_data.get('power_normal'),
+        health_data.get('no_ecc_errors'),
+        health_data.get('fan_operational'),
+        health_data.get('error_count', 0),
+        health_data.get('error_message')
+    )
+
 async def get_gpu_status(gpu_id: str = "gpu-0"):
-    """Get current GPU status."""
+    """Get current GPU status (cached for GPU_STATUS_CACHE_TTL seconds)."""
     if db_pool is None:
         logger.warning("Database not initialized, cannot get GPU status")
         return None
     
+    cached = _gpu_status_cache.get(gpu_id)
+    if cached and time.monotonic() - cached[0] < GPU_STATUS_CACHE_TTL:
+        return dict(cached[1]) if cached[1] else None
+    
     try:
+        generation = _gpu_status_generation
         async with db_pool.acquire() as conn:
             row = await conn.fetchrow('''
                 SELECT * FROM gpu_status WHERE gpu_id = $1
             ''', gpu_id)
-            
-            return dict(row) if row else None
+        
+        status = dict(row) if row else None
+        # Don't cache a row read while a local write was landing
+        if generation == _gpu_status_generation:
+            _gpu_status_cache[gpu_id] = (time.monotonic(), status)
+        return dict(status) if status else None
             
     except Exception as e:
         logger.error(f"Failed to get GPU status: {e}")
@@ -498,23 +637,64 @@ async def update_gpu_status(gpu_id: str, **kwargs):
     
     try:
         async with db_pool.acquire() as conn:
-            # Build dynamic update query
-            set_clauses = ["updated_at = NOW()"]
-            values = [gpu_id]
-            param_count = 1
-            
-            for key, value in kwargs.items():
-                if value is not None:
-                    param_count += 1
-                    set_clauses.append(f"{key} = ${param_count}")
-                    values.append(value)
-            
-            query = f"UPDATE gpu_status SET {', '.join(set_clauses)} WHERE gpu_id = $1"
-            await conn.execute(query, *values)
+            await _update_gpu_status(conn, gpu_id, kwargs)
             
     except Exception as e:
         logger.error(f"Failed to update GPU status: {e}")
 
+async def _update_gpu_status(conn, gpu_id: str, fields: Dict[str, Any]):
+    # Build dynamic update query
+    set_clauses = ["updated_at = NOW()"]
+    values = [gpu_id]
+    param_count = 1
+    
+    for key, value in fields.items():
+        if value is not None:
+            param_count += 1
+            set_clauses.append(f"{key} = ${param_count}")
+            values.append(value)
+    
+    query = f"UPDATE gpu_status SET {', '.join(set_clauses)} WHERE gpu_id = $1"
+    await conn.execute(query, *values)
+    _invalidate_gpu_status()
+
+async def upsert_gpu_state(gpu_id: str, status_fields: Optional[Dict[str, Any]], metrics: Dict[str, Any] = None,
+                           deployment_id: str = None, health_data: Dict[str, Any] = None,
+                           metrics_batch: list = None):
+    """Write metrics and/or health history rows and update gpu_status in one transaction.
+
+    metrics_batch is a list of (sampled_at, metrics, deployment_id) samples
+    inserted with a single executemany. Pass status_fields=None to write only the history
+    rows. Returns True if the transaction committed.
+    """
+    if db_pool is None:
+        logger.warning("Database not initialized, cannot update GPU state")
+        return False
+    
+    try:
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                if metrics is not None:
+                    await _insert_gpu_metrics(conn, gpu_id, metrics, deployment_id)
+                if metrics_batch:
+                    await conn.executemany(_INSERT_GPU_METRICS, [
+                        _gpu_metrics_row(gpu_id, sample, sample_deployment_id, sampled_at)
+                        for sampled_at, sample, sample_deployment_id in metrics_batch
+                    ])
+                if health_data is not None:
+                    await _insert_health_check(conn, gpu_id, health_data)
+                if status_fields is not None:
+                    await _update_gpu_status(conn, gpu_id, status_fields)
+        
+        if status_fields is not None:
+            # Drop anything read before the transaction committed
+            _invalidate_gpu_status()
+        return True
+            
+    except Exception as e:
+        logger.error(f"Failed to update GPU state: {e}")
+        return False
+
 async def cleanup_database():
     """Clean up database connection."""
     global db_pool
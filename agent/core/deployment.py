@@ -10,6 +10,7 @@ from typing import Any, Dict
 from .database import (create_deployment, get_deployment, get_gpu_status,
                        store_gpu_metrics, update_deployment_status,
                        update_gpu_status)
+from .http_client import get_session, request_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -173,13 +174,13 @@ async def pull_docker_image(image_name: str):
     """Pull Docker image if not already present."""
     try:
         # Check if image exists locally
-        result = subprocess.run(['docker', 'images', '-q', image_name], 
-                              capture_output=True, text=True, timeout=10)
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'images', '-q', image_name], 
+                                         capture_output=True, text=True, timeout=10)
         
         if not result.stdout.strip():
             logger.info(f"Pulling Docker image: {image_name}")
-            result = subprocess.run(['docker', 'pull', image_name], 
-                                  capture_output=True, text=True, timeout=300)
+            result = await asyncio.to_thread(subprocess.run, ['docker', 'pull', image_name], 
+                                             capture_output=True, text=True, timeout=300)
             
             if result.returncode != 0:
                 raise Exception(f"Failed to pull image: {result.stderr}")
@@ -257,7 +258,7 @@ async def create_container(deployment_id: str, image_name: str, container_name:
             cmd.extend(['bash', '-c', container_command])
         
         logger.info(f"Creating container: {deployment_id}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = await asyncio.to_thread(subprocess.run, cmd, capture_output=True, text=True, timeout=60)
         
         if result.returncode != 0:
             raise Exception(f"Failed to create container: {result.stderr}")
@@ -288,8 +289,8 @@ async def configure_container(container_name: str, ssh_username: str,
         ]
         
         for cmd in ssh_commands:
-            result = subprocess.run(['docker', 'exec', container_name, 'bash', '-c', cmd],
-                                  capture_output=True, text=True, timeout=30)
+            result = await asyncio.to_thread(subprocess.run, ['docker', 'exec', container_name, 'bash', '-c', cmd],
+                                             capture_output=True, text=True, timeout=30)
             if result.returncode != 0:
                 logger.warning(f"SSH setup command failed: {cmd}")
         
@@ -300,8 +301,8 @@ async def configure_container(container_name: str, ssh_username: str,
         "
         """
         
-        result = subprocess.run(['docker', 'exec', '-d', container_name, 'bash', '-c', jupyter_cmd],
-                              capture_output=True, text=True, timeout=30)
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'exec', '-d', container_name, 'bash', '-c', jupyter_cmd],
+                                         capture_output=True, text=True, timeout=30)
         
         if result.returncode != 0:
             logger.warning("Failed to start Jupyter Lab")
@@ -316,15 +317,15 @@ async def verify_container_health(container_name: str, config: Dict[str, Any]):
     """Verify container health and accessibility (optional for basic images)."""
     try:
         # Check if container is running
-        result = subprocess.run(['docker', 'ps', '--filter', f'name={container_name}'],
-                              capture_output=True, text=True, timeout=10)
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'ps', '--filter', f'name={container_name}'],
+                                         capture_output=True, text=True, timeout=10)
         
         if container_name not in result.stdout:
             raise Exception("Container is not running")
         
         # Check GPU accessibility (optional - skip if nvidia-smi not available)
-        result = subprocess.run(['docker', 'exec', container_name, 'nvidia-smi'],
-                            capture_output=True, text=True, timeout=10)
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'exec', container_name, 'nvidia-smi'],
+                                         capture_output=True, text=True, timeout=10)
         
         if result.returncode != 0:
             logger.warning("GPU not accessible in container (nvidia-smi not available)")
@@ -338,13 +339,14 @@ async def verify_container_health(container_name: str, config: Dict[str, Any]):
 async def stop_container(container_id: str):
     """Stop Docker container gracefully."""
     try:
-        result = subprocess.run(['docker', 'stop', '--time', '30', container_id],
-                              capture_output=True, text=True, timeout=60)
+        # docker stop can wait up to 30s for the container; keep that off the event loop
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'stop', '--time', '30', container_id],
+                                         capture_output=True, text=True, timeout=60)
         
         if result.returncode != 0:
             logger.warning(f"Failed to stop container gracefully: {result.stderr}")
             # Force kill if graceful stop failed
-            subprocess.run(['docker', 'kill', container_id], timeout=30)
+            await asyncio.to_thread(subprocess.run, ['docker', 'kill', container_id], timeout=30)
         
         logger.info(f"Container stopped: {container_id}")
         
@@ -355,8 +357,8 @@ async def stop_container(container_id: str):
 async def remove_container(container_id: str):
     """Remove Docker container."""
     try:
-        result = subprocess.run(['docker', 'rm', container_id],
-                              capture_output=True, text=True, timeout=30)
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'rm', container_id],
+                                         capture_output=True, text=True, timeout=30)
         
         if result.returncode != 0:
             raise Exception(f"Failed to remove container: {result.stderr}")
@@ -371,14 +373,14 @@ async def cleanup_gpu_resources():
     """Clean up GPU resources after deployment termination."""
     try:
         # Check GPU memory usage
-        result = subprocess.run(['nvidia-smi', '--query-gpu=memory.used', '--format=csv,noheader,nounits'],
-                              capture_output=True, text=True, timeout=10)
+        result = await asyncio.to_thread(subprocess.run, ['nvidia-smi', '--query-gpu=memory.used', '--format=csv,noheader,nounits'],
+                                         capture_output=True, text=True, timeout=10)
         
         if result.returncode == 0:
             memory_used = int(result.stdout.strip())
             if memory_used > 100:  # More than 100MB used
                 logger.warning("GPU memory not fully released, resetting...")
-                subprocess.run(['nvidia-smi', '--gpu-reset'], timeout=30)
+                await asyncio.to_thread(subprocess.run, ['nvidia-smi', '--gpu-reset'], timeout=30)
                 await asyncio.sleep(5)
         
         logger.info("GPU resources cleaned")
@@ -390,12 +392,12 @@ async def cleanup_failed_deployment(deployment_id: str):
     """Clean up resources when deployment fails."""
     try:
         # Try to stop and remove container if it exists
-        result = subprocess.run(['docker', 'ps', '-a', '--filter', f'name={deployment_id}'],
-                              capture_output=True, text=True, timeout=10)
+        result = await asyncio.to_thread(subprocess.run, ['docker', 'ps', '-a', '--filter', f'name={deployment_id}'],
+                                         capture_output=True, text=True, timeout=10)
         
         if deployment_id in result.stdout:
-            subprocess.run(['docker', 'stop', deployment_id], timeout=30)
-            subprocess.run(['docker', 'rm', deployment_id], timeout=30)
+            await asyncio.to_thread(subprocess.run, ['docker', 'stop', deployment_id], timeout=30)
+            await asyncio.to_thread(subprocess.run, ['docker', 'rm', deployment_id], timeout=30)
         
         # Update database
         await update_deployment_status(deployment_id, 'failed')
@@ -413,8 +415,6 @@ async def notify_deployment_success(config: Dict[str, Any], deployment_id: str,
                                   ssh_username: str, ssh_password: str, jupyter_token: str, port_mappings: Dict[str, int]):
     """Notify central server of successful deployment."""
     try:
-        import requests
-        
         url = f"{config['server']['url']}/api/deployments/{deployment_id}/success"
         headers = {
             'Authorization': f"Bearer {config['agent']['api_key']}",
@@ -455,12 +455,14 @@ async def notify_deployment_success(config: Dict[str, Any], deployment_id: str,
             }
         }
         
-        response = requests.post(url, json=payload, headers=headers, timeout=config['server']['timeout'])
+        async with get_session().post(url, json=payload, headers=headers,
+                                      timeout=request_timeout(config['server']['timeout'])) as response:
+            status = response.status
         
-        if response.status_code == 200:
+        if status == 200:
             logger.info("Deployment success notification sent")
         else:
-            logger.warning(f"Deployment notification failed: {response.status_code}")
+            logger.warning(f"Deployment notification failed: {status}")
             
     except Exception as e:
         logger.error(f"Failed to notify deployment success: {e}")
@@ -468,8 +470,6 @@ async def notify_deployment_success(config: Dict[str, Any], deployment_id: str,
 async def notify_deployment_terminated(deployment_id: str, reason: str):
     """Notify central server of deployment termination."""
     try:
-        import requests
-
         # This would need the config to be passed in
         # For now, just log the termination
         logger.info(f"Deployment terminated: {deployment_id} (reason: {reason})")
@@ -1,18 +1,93 @@
 # host-agent/agent/core/hardware.py
+import atexit
+import json
 import logging
+import os
 import platform
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional
 
 import psutil
 
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+try:
+    import docker
+except ImportError:
+    docker = None
+
 logger = logging.getLogger(__name__)
 
+# NVML device handles, initialised on first use (None = not tried yet). NVML
+# calls are thread-safe, but first use can come from several threads at once.
+_nvml_handles = None
+_nvml_lock = threading.Lock()
+
+def get_nvml_handles() -> Optional[list]:
+    """Initialise NVML once and return the cached device handles.
+
+    Returns None when pynvml is not installed or NVML cannot be initialised,
+    in which case callers fall back to nvidia-smi.
+    """
+    global _nvml_handles
+    if _nvml_handles is None:
+        with _nvml_lock:
+            if _nvml_handles is None:
+                handles = []
+                if pynvml is not None:
+                    try:
+                        pynvml.nvmlInit()
+                        atexit.register(pynvml.nvmlShutdown)
+                        handles = [
+                            pynvml.nvmlDeviceGetHandleByIndex(i)
+                            for i in range(pynvml.nvmlDeviceGetCount())
+                        ]
+                    except pynvml.NVMLError as e:
+                        logger.warning(f"NVML unavailable, falling back to nvidia-smi: {e}")
+                # Publish only the finished list so other threads never see a partial one
+                _nvml_handles = handles
+    
+    return _nvml_handles or None
+
+def _nvml_str(value) -> str:
+    """NVML returns bytes on older pynvml releases and str on newer ones."""
+    return value.decode() if isinstance(value, bytes) else value
+
+# Static GPU description, kept after the first successful read
+_gpu_info = None
+
 def get_gpu_info() -> Dict[str, Any]:
-    """Collect GPU information using nvidia-smi."""
+    """Return GPU information (name, memory, UUID, driver), read once and then cached."""
+    global _gpu_info
+    if _gpu_info is None:
+        _gpu_info = _read_gpu_info()
+    return dict(_gpu_info)
+
+def _read_gpu_info() -> Dict[str, Any]:
+    """Collect GPU information using NVML, or nvidia-smi if NVML is unavailable."""
     try:
+        handles = get_nvml_handles()
+        if handles:
+            handle = handles[0]
+            major, minor = pynvml.nvmlDeviceGetCudaComputeCapability(handle)
+            cuda_driver = pynvml.nvmlSystemGetCudaDriverVersion()
+            
+            return {
+                'name': _nvml_str(pynvml.nvmlDeviceGetName(handle)),
+                'memory_mb': pynvml.nvmlDeviceGetMemoryInfo(handle).total >> 20,
+                'hardware_uuid': _nvml_str(pynvml.nvmlDeviceGetUUID(handle)),
+                'driver_version': _nvml_str(pynvml.nvmlSystemGetDriverVersion()),
+                'cuda_version': f"{cuda_driver // 1000}.{cuda_driver % 1000 // 10}",
+                'compute_capability': f"{major}.{minor}"
+            }
+        
         # Get GPU name, memory, UUID, driver version, compute capability
         result = subprocess.run([
             'nvidia-smi', '--query-gpu=name,memory.total,uuid,driver_version,compute_cap',
@@ -53,24 +128,23 @@ def get_gpu_info() -> Dict[str, Any]:
         logger.error(f"Failed to get GPU info: {e}")
         raise
 
+_cuda_version = None
+
 def get_cuda_version() -> str:
-    """Get CUDA version from nvidia-smi."""
+    """Get CUDA version from nvidia-smi (cached, the driver does not change under us)."""
+    global _cuda_version
+    if _cuda_version is not None:
+        return _cuda_version
     try:
         result = subprocess.run([
-            'nvidia-smi', '--query-gpu=driver_version', '--format=csv,noheader'
+            'nvidia-smi'
         ], capture_output=True, text=True, timeout=5)
         
         if result.returncode == 0:
-            # Try to get CUDA version from nvidia-smi
-            result = subprocess.run([
-                'nvidia-smi'
-            ], capture_output=True, text=True, timeout=5)
-            
-            if result.returncode == 0:
-                for line in result.stdout.split('\n'):
-                    if 'CUDA Version:' in line:
-                        cuda_version = line.split('CUDA Version:')[1].strip().split()[0]
-                        return cuda_version
+            for line in result.stdout.split('\n'):
+                if 'CUDA Version:' in line:
+                    _cuda_version = line.split('CUDA Version:')[1].strip().split()[0]
+                    return _cuda_version
         
         # Fallback: try nvcc
         result = subprocess.run(['nvcc', '--version'], capture_output=True, text=True, timeout=5)
@@ -78,68 +152,167 @@ def get_cuda_version() -> str:
             for line in result.stdout.split('\n'):
                 if 'release' in line.lower():
                     # Extract version from "release 12.2, V12.2.140"
-                    version_part = line.split('release')[1].split(',')[0].strip()
-                    return version_part
+                    _cuda_version = line.split('release')[1].split(',')[0].strip()
+                    return _cuda_version
         
-        return "Unknown"
+        _cuda_version = "Unknown"
+        return _cuda_version
         
     except Exception as e:
         logger.warning(f"Could not determine CUDA version: {e}")
         return "Unknown"
 
+# Host facts that cannot change while the agent is running
+_STATIC_INFO: Dict[str, Any] = {}
+
+def _init_static():
+    """Populate _STATIC_INFO once."""
+    cpu_info = platform.processor()
+    if not cpu_info:
+        cpu_info = platform.machine()
+    
+    _STATIC_INFO.update({
+        'hostname': platform.node(),
+        'cpu': cpu_info,
+        'os': f"{platform.system()} {platform.release()}",
+        'ram_mb': read_meminfo()['total'] >> 20
+    })
+
 def get_host_info() -> Dict[str, Any]:
     """Collect host system information."""
     try:
-        # CPU information
-        cpu_info = platform.processor()
-        if not cpu_info:
-            cpu_info = platform.machine()
-        
-        # RAM information
-        ram_mb = psutil.virtual_memory().total // (1024 * 1024)
-        
-        # OS information
-        os_info = f"{platform.system()} {platform.release()}"
-        
-        # Docker version
-        docker_version = get_docker_version()
+        if not _STATIC_INFO:
+            _init_static()
         
         return {
-            'cpu': cpu_info,
-            'ram_mb': ram_mb,
-            'os': os_info,
-            'docker_version': docker_version
+            'cpu': _STATIC_INFO['cpu'],
+            'ram_mb': _STATIC_INFO['ram_mb'],
+            'os': _STATIC_INFO['os'],
+            'docker_version': get_docker_version()
         }
         
     except Exception as e:
         logger.error(f"Failed to get host info: {e}")
         raise
 
+# Docker can be upgraded in place, so only trust the cached version for a while
+DOCKER_VERSION_TTL = 3600
+_docker_version = (0.0, None)
+
 def get_docker_version() -> str:
-    """Get Docker version."""
+    """Get Docker version from the daemon API, or the docker CLI as a fallback."""
+    global _docker_version
+    checked_at, version = _docker_version
+    if version is not None and time.monotonic() - checked_at < DOCKER_VERSION_TTL:
+        return version
     try:
+        if docker is not None:
+            try:
+                client = docker.from_env()
+                try:
+                    version = f"Docker version {client.version()['Version']}"
+                finally:
+                    client.close()
+                _docker_version = (time.monotonic(), version)
+                return version
+            except Exception as e:
+                logger.debug(f"Docker API unavailable, using docker CLI: {e}")
+        
         result = subprocess.run(['docker', '--version'], capture_output=True, text=True, timeout=5)
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return "Unknown"
+        version = result.stdout.strip() if result.returncode == 0 else "Unknown"
+        _docker_version = (time.monotonic(), version)
+        return version
     except Exception as e:
         logger.warning(f"Could not get Docker version: {e}")
         return "Unknown"
 
+class NvidiaSmiSampler:
+    """Keep one looping nvidia-smi process alive and remember its latest sample.
+
+    Used when NVML is unavailable, so a metrics read costs a lock instead of
+    a fork+exec and driver initialisation per call. The process is restarted
+    on the next read if it exits, or if it stops producing samples (as it
+    does when a GPU falls off the bus); a sample older than STALE_INTERVALS
+    periods is never returned.
+    """
+    
+    QUERY = 'utilization.gpu,memory.used,memory.total,temperature.gpu,power.draw,fan.speed'
+    STALE_INTERVALS = 3
+    
+    def __init__(self, interval_ms: int, gpu_index: int = 0):
+        self.interval_ms = interval_ms
+        self.gpu_index = gpu_index
+        self._proc = None
+        self._started_at = 0.0
+        self._latest = None  # (monotonic time, CSV line)
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def max_age(self) -> float:
+        return self.STALE_INTERVALS * self.interval_ms / 1000
+    
+    def latest(self, wait: float = 5.0) -> Optional[str]:
+        """Return the most recent CSV sample line (None if there is no fresh one), starting nvidia-smi if needed."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            elif time.monotonic() - (self._latest[0] if self._latest else self._started_at) > self.max_age:
+                logger.warning("nvidia-smi sampler stopped producing samples, restarting")
+                self._proc.kill()
+                self._start()
+        
+        self._ready.wait(wait)
+        sample = self._latest
+        if sample is None or time.monotonic() - sample[0] > self.max_age:
+            return None
+        return sample[1]
+    
+    def _start(self):
+        if self._proc is not None and self._proc.poll() is not None:
+            logger.warning("nvidia-smi sampler exited, restarting")
+        
+        self._latest = None
+        self._ready.clear()
+        self._started_at = time.monotonic()
+        self._proc = subprocess.Popen([
+            'nvidia-smi', f'--id={self.gpu_index}',
+            f'--query-gpu={self.QUERY}',
+            '--format=csv,noheader,nounits',
+            '-lms', str(self.interval_ms)
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        
+        threading.Thread(target=self._read, args=(self._proc,), name="nvidia-smi-sampler", daemon=True).start()
+    
+    def _read(self, proc: subprocess.Popen):
+        for line in proc.stdout:
+            line = line.strip()
+            # A replaced (killed) process must not overwrite its successor's samples
+            if line and proc is self._proc:
+                self._latest = (time.monotonic(), line)
+                self._ready.set()
+        
+        # EOF: reap the process here (a killed one is never waited on elsewhere)
+        # and unblock waiters; the next latest() call restarts the process
+        proc.stdout.close()
+        proc.wait()
+        if proc is self._proc:
+            self._ready.set()
+
+# Sampling period of the fallback nvidia-smi process
+SMI_LOOP_INTERVAL_MS = 2000
+
+_smi_sampler = NvidiaSmiSampler(SMI_LOOP_INTERVAL_MS)
+
 def collect_gpu_metrics() -> Dict[str, Any]:
     """Collect current GPU metrics."""
     try:
-        # Get GPU utilization, memory usage, temperature, power, fan speed
-        result = subprocess.run([
-            'nvidia-smi', 
-            '--query-gpu=utilization.gpu,memory.used,memory.total,temperature.gpu,power.draw,fan.speed',
-            '--format=csv,noheader,nounits'
-        ], capture_output=True, text=True, timeout=5)
-        
-        if result.returncode != 0:
-            raise Exception(f"nvidia-smi failed: {result.stderr}")
+        handles = get_nvml_handles()
+        if handles:
+            return collect_gpu_metrics_nvml(handles[0])
         
-        line = result.stdout.strip()
+        # Latest utilization, memory usage, temperature, power, fan speed sample
+        line = _smi_sampler.latest()
         if not line:
             raise Exception("No GPU metrics returned")
         
@@ -167,6 +340,25 @@ def collect_gpu_metrics() -> Dict[str, Any]:
             'fan_speed_percent': 0.0
         }
 
+def collect_gpu_metrics_nvml(handle) -> Dict[str, Any]:
+    """Collect current GPU metrics for one device through NVML."""
+    memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+    
+    try:
+        fan_speed = float(pynvml.nvmlDeviceGetFanSpeed(handle))
+    except pynvml.NVMLError:
+        # Passively cooled / 0 RPM GPUs don't report a fan speed
+        fan_speed = 0.0
+    
+    return {
+        'gpu_utilization': float(pynvml.nvmlDeviceGetUtilizationRates(handle).gpu),
+        'vram_used_mb': memory.used >> 20,
+        'vram_total_mb': memory.total >> 20,
+        'temperature_celsius': float(pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)),
+        'power_draw_watts': pynvml.nvmlDeviceGetPowerUsage(handle) / 1000.0,  # mW -> W
+        'fan_speed_percent': fan_speed
+    }
+
 def check_gpu_health() -> Dict[str, Any]:
     """Perform comprehensive GPU health check."""
     health_status = {
@@ -322,17 +514,66 @@ def get_total_vram_gb() -> int:
             for line in result.stdout.strip().split('\n'):
                 if line.strip():
                     total_mb += int(line.strip())
-            return total_mb // 1024  # Convert MB to GB
+            return total_mb >> 10  # Convert MB to GB
         return 0
     except Exception as e:
         logger.warning(f"Could not get total VRAM: {e}")
         return 0
 
+# /proc/meminfo stays open; procfs regenerates it on every read at offset 0
+_meminfo_fd = None
+
+def read_meminfo() -> Dict[str, int]:
+    """Return total/available/used RAM in bytes, read straight from /proc/meminfo."""
+    global _meminfo_fd
+    try:
+        if _meminfo_fd is None:
+            _meminfo_fd = os.open('/proc/meminfo', os.O_RDONLY)
+        data = os.pread(_meminfo_fd, 8192, 0)
+        values = {}
+        for line in data.split(b'\n'):
+            key, _, rest = line.partition(b':')
+            if key in (b'MemTotal', b'MemAvailable'):
+                values[key] = int(rest.split()[0]) << 10
+        total = values[b'MemTotal']
+        available = values[b'MemAvailable']
+    except (OSError, KeyError, ValueError, IndexError):
+        # Non-Linux hosts (or very old kernels without MemAvailable)
+        memory = psutil.virtual_memory()
+        total, available = memory.total, memory.available
+    return {'total': total, 'available': available, 'used': total - available}
+
+def read_disk_usage(path: str = '/') -> Dict[str, int]:
+    """Return total/free/used bytes for the filesystem holding path."""
+    if not hasattr(os, 'statvfs'):
+        disk = psutil.disk_usage(path)
+        return {'total': disk.total, 'free': disk.free, 'used': disk.used}
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    return {
+        'total': total,
+        'free': st.f_bavail * st.f_frsize,
+        'used': total - st.f_bfree * st.f_frsize
+    }
+
+# Boot time never changes, so it is derived once
+_boot_time = None
+
+def get_boot_time() -> float:
+    """Return the boot time as a Unix timestamp (whole seconds)."""
+    global _boot_time
+    if _boot_time is None:
+        if hasattr(time, 'CLOCK_BOOTTIME'):
+            _boot_time = float(int(time.time() - time.clock_gettime(time.CLOCK_BOOTTIME)))
+        else:
+            _boot_time = psutil.boot_time()
+    return _boot_time
+
 def get_storage_info() -> Dict[str, Any]:
     """Get storage information."""
     try:
         # Get disk usage for root partition
-        disk = psutil.disk_usage('/')
+        disk = read_disk_usage('/')
         
         # Try to determine storage type
         storage_type = "Unknown"
@@ -350,9 +591,9 @@ def get_storage_info() -> Dict[str, Any]:
             pass
         
         return {
-            'storage_total_gb': disk.total // (1024**3),
-            'storage_available_gb': disk.free // (1024**3),
-            'storage_used_gb': disk.used // (1024**3),
+            'storage_total_gb': disk['total'] >> 30,
+            'storage_available_gb': disk['free'] >> 30,
+            'storage_used_gb': disk['used'] >> 30,
             'storage_type': storage_type
         }
     except Exception as e:
@@ -364,41 +605,72 @@ def get_storage_info() -> Dict[str, Any]:
             'storage_type': 'Unknown'
         }
 
+# Last real speedtest result, kept on disk so restarts (and reboots) within
+# SPEEDTEST_TTL reuse it instead of spending up to 30s re-measuring
+SPEEDTEST_CACHE = '/var/lib/taolie-host-agent/speedtest.json'
+SPEEDTEST_TTL = 24 * 3600
+
+def load_speedtest_result() -> Optional[Dict[str, Any]]:
+    """Return the cached speedtest result if it is younger than SPEEDTEST_TTL."""
+    try:
+        with open(SPEEDTEST_CACHE, 'r') as f:
+            cached = json.load(f)
+        if time.time() - cached['measured_at'] < SPEEDTEST_TTL:
+            return cached['result']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def save_speedtest_result(result: Dict[str, Any]):
+    """Persist a speedtest result for later registrations."""
+    try:
+        os.makedirs(os.path.dirname(SPEEDTEST_CACHE), exist_ok=True)
+        # Write alongside and rename so a crash can't leave a truncated file
+        tmp_path = f"{SPEEDTEST_CACHE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'measured_at': time.time(), 'result': result}, f)
+        os.replace(tmp_path, SPEEDTEST_CACHE)
+    except OSError as e:
+        logger.debug(f"Could not cache speedtest result: {e}")
+
 def get_network_speed() -> Dict[str, Any]:
     """Get network speed (simplified - uses quick test)."""
     try:
+        cached = load_speedtest_result()
+        if cached is not None:
+            logger.info("Using network speed measured within the last 24h")
+            return cached
+        
         # For production, you might want to use speedtest-cli
         # For now, return estimated values based on connection type
         # This is a placeholder - in production you'd do actual speed tests
         
-        # Check if speedtest-cli is available
+        # Run the speed test directly; a missing speedtest-cli raises and falls through
         try:
-            result = subprocess.run(['speedtest-cli', '--version'], 
-                                  capture_output=True, text=True, timeout=2)
+            logger.info("Running network speed test...")
+            result = subprocess.run(['speedtest-cli', '--simple'], 
+                                  capture_output=True, text=True, timeout=30)
             if result.returncode == 0:
-                # Run actual speed test (this takes time, so maybe do it less frequently)
-                logger.info("Running network speed test...")
-                result = subprocess.run(['speedtest-cli', '--simple'], 
-                                      capture_output=True, text=True, timeout=30)
-                if result.returncode == 0:
-                    lines = result.stdout.strip().split('\n')
-                    download = 0
-                    upload = 0
-                    latency = 0
-                    
-                    for line in lines:
-                        if 'Download:' in line:
-                            download = float(line.split(':')[1].strip().split()[0])
-                        elif 'Upload:' in line:
-                            upload = float(line.split(':')[1].strip().split()[0])
-                        elif 'Ping:' in line:
-                            latency = float(line.split(':')[1].strip().split()[0])
-                    
-                    return {
-                        'download_speed_mbps': download,
-                        'upload_speed_mbps': upload,
-                        'latency_ms': latency
-                    }
+                lines = result.stdout.strip().split('\n')
+                download = 0
+                upload = 0
+                latency = 0
+                
+                for line in lines:
+                    if 'Download:' in line:
+                        download = float(line.split(':')[1].strip().split()[0])
+                    elif 'Upload:' in line:
+                        upload = float(line.split(':')[1].strip().split()[0])
+                    elif 'Ping:' in line:
+                        latency = float(line.split(':')[1].strip().split()[0])
+                
+                result = {
+                    'download_speed_mbps': download,
+                    'upload_speed_mbps': upload,
+                    'latency_ms': latency
+                }
+                save_speedtest_result(result)
+                return result
         except:
             pass
         
@@ -429,7 +701,7 @@ def get_network_speed() -> Dict[str, Any]:
 def get_uptime_info() -> Dict[str, Any]:
     """Get system uptime information."""
     try:
-        boot_time = psutil.boot_time()
+        boot_time = get_boot_time()
         uptime_seconds = time.time() - boot_time
         uptime_hours = int(uptime_seconds / 3600)
         last_reboot = datetime.fromtimestamp(boot_time).isoformat()
@@ -448,18 +720,29 @@ def get_uptime_info() -> Dict[str, Any]:
 def get_comprehensive_system_info() -> Dict[str, Any]:
     """Collect all comprehensive system information for registration."""
     try:
-        gpu_info = get_gpu_info()
-        host_info = get_host_info()
-        storage_info = get_storage_info()
-        network_info = get_network_speed()
-        uptime_info = get_uptime_info()
+        # The probes are independent and mostly wait on subprocesses or the
+        # network (speedtest can take tens of seconds), so run them side by side
+        with ThreadPoolExecutor(max_workers=7) as pool:
+            gpu_info = pool.submit(get_gpu_info)
+            host_info = pool.submit(get_host_info)
+            storage_info = pool.submit(get_storage_info)
+            network_info = pool.submit(get_network_speed)
+            uptime_info = pool.submit(get_uptime_info)
+            gpu_count = pool.submit(get_gpu_count)
+            total_vram_gb = pool.submit(get_total_vram_gb)
+        
+        gpu_info = gpu_info.result()
+        host_info = host_info.result()
+        storage_info = storage_info.result()
+        network_info = network_info.result()
+        uptime_info = uptime_info.result()
         
         # CPU cores
         cpu_cores = psutil.cpu_count(logical=False) or psutil.cpu_count()
         
         # GPU count and total VRAM
-        gpu_count = get_gpu_count()
-        total_vram_gb = get_total_vram_gb()
+        gpu_count = gpu_count.result()
+        total_vram_gb = total_vram_gb.result()
         
         return {
             # GPU Information
@@ -470,11 +753,11 @@ def get_comprehensive_system_info() -> Dict[str, Any]:
             'cuda_version': gpu_info['cuda_version'],
             
             # Host Information
-            'hostname': platform.node(),
+            'hostname': _STATIC_INFO['hostname'],
             'os': host_info['os'],
             'cpu_count': 1,  # Number of CPU sockets
             'cpu_cores': cpu_cores,
-            'total_ram_gb': host_info['ram_mb'] // 1024,
+            'total_ram_gb': host_info['ram_mb'] >> 10,
             'total_vram_gb': total_vram_gb,
             
             # Storage Information
@@ -496,22 +779,22 @@ def get_comprehensive_system_info() -> Dict[str, Any]:
         logger.error(f"Failed to collect comprehensive system info: {e}")
         raise
 
+# Prime psutil's CPU counters so the first non-blocking sample is meaningful
+psutil.cpu_percent(interval=None)
+
 def collect_system_metrics() -> Dict[str, Any]:
     """Collect current system metrics (CPU, RAM, storage, network)."""
     try:
-        # CPU utilization
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # CPU utilization since the previous call (primed at import, no sleep)
+        cpu_percent = psutil.cpu_percent(interval=None)
         
         # RAM usage
-        ram = psutil.virtual_memory()
-        ram_used_gb = ram.used / (1024**3)
+        ram = read_meminfo()
+        ram_used_gb = ram['used'] / (1024**3)
         
         # Storage usage
-        disk = psutil.disk_usage('/')
-        storage_used_gb = disk.used / (1024**3)
-        
-        # Network utilization (simplified)
-        net_io = psutil.net_io_counters()
+        disk = read_disk_usage('/')
+        storage_used_gb = disk['used'] / (1024**3)
         
         # Calculate network speed (bytes per second over last interval)
         # This is a simplified version - you might want to track this over time
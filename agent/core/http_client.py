@@ -0,0 +1,37 @@
+# host-agent/agent/core/http_client.py
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP session, created on first use inside the running event loop
+http_session = None
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared keep-alive session used for all server traffic."""
+    global http_session
+    if http_session is None or http_session.closed:
+        # Everything goes to the one central server: a few kept-alive
+        # connections and a long-lived DNS entry are all that is needed
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=16,
+                limit_per_host=4,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+        )
+    return http_session
+
+def request_timeout(seconds: float) -> aiohttp.ClientTimeout:
+    """Build a total-time limit for a single request."""
+    return aiohttp.ClientTimeout(total=seconds)
+
+async def close_session():
+    """Close the shared HTTP session."""
+    global http_session
+    if http_session is not None:
+        await http_session.close()
+        http_session = None
+        logger.info("HTTP session closed")
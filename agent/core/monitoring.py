@@ -1,301 +1,688 @@
 # host-agent/agent/core/monitoring.py
 import asyncio
+import hashlib
+import itertools
 import logging
-from datetime import datetime
-from typing import Any, Dict
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 
-import requests
+import orjson
 
 from .database import (get_expired_deployments, get_gpu_status,
-                       store_gpu_metrics, store_health_check,
-                       update_deployment_status, update_gpu_status)
+                       update_deployment_status, upsert_gpu_state)
 from .deployment import terminate_deployment
 from .hardware import (calculate_health_scores, check_gpu_health,
                        collect_gpu_metrics, collect_system_metrics,
                        get_uptime_info)
+from .http_client import get_session, request_timeout
 
 logger = logging.getLogger(__name__)
 
-async def start_gpu_monitoring(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 1: GPU Monitoring - Collect GPU metrics every interval seconds."""
-    logger.info("GPU monitoring thread started")
+@dataclass(slots=True)
+class MetricsPayload:
+    """One metrics sample as pushed to the server.
+
+    orjson serializes dataclasses natively (field order is preserved), and
+    aware datetimes as RFC 3339, so samples are queued and sent as-is.
+    """
+    agent_id: str
+    gpu_uuid: Optional[str]
+    gpu_utilization: float
+    vram_used_mb: int
+    temperature_celsius: float
+    power_draw_watts: float
+    fan_speed_percent: float
+    cpu_utilization: float
+    ram_used_gb: float
+    storage_used_gb: float
+    network_utilization: float
+    current_upload_mbps: float
+    current_download_mbps: float
+    uptime_hours: int
+    timestamp: datetime
+
+# Metrics payloads that have not been accepted by the server yet. Kept bounded
+# so a long outage only retains the most recent samples.
+_pending_metrics = deque(maxlen=60)
+
+# Health pushes whose content matches the last accepted one are skipped, but a
+# full push is still sent at least this often so the server never goes stale.
+HEALTH_RESYNC_SECONDS = 600
+
+# Health payload fields that change every tick without the health changing
+_VOLATILE_HEALTH_KEYS = ('last_health_check', 'timestamp')
+
+class ServerEndpoints:
+    """URLs, headers and timeout for the central server, built once per agent."""
     
-    while True:
-        try:
-            # Collect GPU metrics
-            metrics = collect_gpu_metrics()
-            
-            # Get current deployment ID if any
-            gpu_status = await get_gpu_status()
-            deployment_id = gpu_status.get('current_deployment_id') if gpu_status else None
-            
-            # Store metrics in database
-            await store_gpu_metrics('gpu-0', metrics, deployment_id)
-            
-            # Update GPU status with current metrics
-            await update_gpu_status('gpu-0', 
-                gpu_utilization=metrics['gpu_utilization'],
-                vram_used_mb=metrics['vram_used_mb'],
-                temperature_celsius=metrics['temperature_celsius'],
-                power_draw_watts=metrics['power_draw_watts'],
-                fan_speed_percent=metrics['fan_speed_percent']
-            )
-            
-            logger.debug(f"GPU metrics collected: {metrics['gpu_utilization']:.1f}% utilization")
-            
-        except Exception as e:
-            logger.error(f"Error in GPU monitoring: {e}")
+    def __init__(self, config: Dict[str, Any]):
+        base = f"{config['server']['url']}/api/host-agents"
+        agent_id = config['agent']['id']
+        self.headers = {
+            'Authorization': f"Bearer {config['agent']['api_key']}",
+            'Content-Type': 'application/json'
+        }
+        self.timeout = request_timeout(config['server']['timeout'])
+        self.heartbeat = f"{base}/{agent_id}/heartbeat"
+        self.commands = f"{base}/{agent_id}/commands"
+        self.commands_ack = f"{base}/{agent_id}/commands/ack"
+        self.telemetry_batch = f"{base}/{agent_id}/telemetry/batch"
+        self.metrics = f"{base}/metrics"
+        self.health = f"{base}/health"
+
+_endpoints = None
+
+def get_endpoints(config: Dict[str, Any]) -> ServerEndpoints:
+    """Return the cached server endpoints, building them on first use."""
+    global _endpoints
+    if _endpoints is None:
+        _endpoints = ServerEndpoints(config)
+    return _endpoints
+
+# Wall-clock time of the current scheduler wave, shared by the payloads built in it
+_wave_time = None
+
+def wave_time() -> datetime:
+    """Timestamp for payloads built in the current scheduler wave (UTC)."""
+    return _wave_time or datetime.now(timezone.utc)
+
+# Digest and time of the last health payload the server accepted
+_last_health_push = {'digest': None, 'at': 0.0}
+
+# With server.batch_telemetry enabled, heartbeats, metrics and health samples
+# are tagged and queued here, then sent together on each metrics tick.
+_telemetry_batch = deque()
+MAX_PENDING_TELEMETRY = 180
+MAX_BATCH = 100
+
+class ServerCircuit:
+    """Stop talking to the central server for a while after repeated failures.
+
+    All loops share one breaker since they all hit the same server. It opens
+    after FAILURE_THRESHOLD consecutive failures and stays open for an
+    exponentially growing window (capped at MAX_BACKOFF seconds); the first
+    call after the window is the probe that closes it again.
+    """
+    
+    FAILURE_THRESHOLD = 3
+    MAX_BACKOFF = 300
+    
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+    
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+    
+    def record(self, ok: bool):
+        """Record the outcome of a server call."""
+        if ok:
+            if self.failures >= self.FAILURE_THRESHOLD:
+                logger.info("Central server reachable again, resuming pushes")
+            self.failures = 0
+            self.open_until = 0.0
+            return
         
-        await asyncio.sleep(interval)
+        self.failures += 1
+        if self.failures >= self.FAILURE_THRESHOLD:
+            backoff = min(2 ** self.failures, self.MAX_BACKOFF)
+            self.open_until = time.monotonic() + backoff
+            if self.failures == self.FAILURE_THRESHOLD:
+                logger.warning(f"Central server unreachable, pausing pushes (retrying with backoff up to {self.MAX_BACKOFF}s)")
+
+_server_circuit = ServerCircuit()
+
+class MetricsCache:
+    """Share the latest GPU sample and health check between the loops.
+
+    Several loops need the same readings on overlapping intervals; each asks
+    for a value no older than its own interval, so the collector only runs
+    when every cached copy is stale. Collectors block (NVML, nvidia-smi,
+    /proc), so they run in a worker thread, one lock per kind. The periodic
+    GPU readings share one dedicated sampler thread, so a slow driver call
+    holds up only GPU sampling rather than the default pool. NVML is
+    thread-safe and is also called from other threads (startup system info,
+    the rental API), so this is not what makes NVML use safe.
+    """
+    
+    COLLECTORS = {
+        'gpu': collect_gpu_metrics,
+        'health': check_gpu_health,
+        'uptime': get_uptime_info
+    }
+    GPU_KINDS = ('gpu', 'health')
+    
+    def __init__(self):
+        self._locks = {kind: asyncio.Lock() for kind in self.COLLECTORS}
+        self._values = {}
+        self._gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gpu-sampler')
+    
+    async def get(self, kind: str, max_age: float) -> Dict[str, Any]:
+        """Return a cached reading of kind, collecting a fresh one if it is older than max_age."""
+        async with self._locks[kind]:
+            cached = self._values.get(kind)
+            if cached is not None and time.monotonic() - cached[0] < max_age:
+                return cached[1]
+            # run_in_executor directly: the collectors use no context variables,
+            # so to_thread's per-call context copy buys nothing here
+            executor = self._gpu_executor if kind in self.GPU_KINDS else None
+            value = await asyncio.get_running_loop().run_in_executor(executor, self.COLLECTORS[kind])
+            self._values[kind] = (time.monotonic(), value)
+            return value
+
+_metrics_cache = MetricsCache()
+
+# Uptime is reported in whole hours, so a minute-old reading is plenty fresh
+UPTIME_MAX_AGE = 60
+
+# Smallest change per gpu_status field worth writing to the database, and how
+# often the row is rewritten anyway so updated_at never goes stale
+GPU_STATUS_THRESHOLDS = {
+    'gpu_utilization': 1.0,
+    'vram_used_mb': 64,
+    'temperature_celsius': 1.0,
+    'power_draw_watts': 5.0,
+    'fan_speed_percent': 1.0
+}
+GPU_STATUS_RESYNC_SECONDS = 300
+
+# Last gpu_status readings written by the GPU monitoring job
+_last_gpu_status = {'fields': None, 'at': 0.0}
+
+def gpu_status_changed(fields: Dict[str, Any]) -> bool:
+    """Whether fields differ enough from the last written gpu_status to store them."""
+    last = _last_gpu_status['fields']
+    if last is None or time.monotonic() - _last_gpu_status['at'] >= GPU_STATUS_RESYNC_SECONDS:
+        return True
+    return any(abs(fields[key] - last[key]) >= threshold for key, threshold in GPU_STATUS_THRESHOLDS.items())
+
+# Digest of the last metrics payload pushed, for the scheduler's idle detection
+_last_metrics_digest = {'digest': None}
+
+# gpu_metrics history rows are buffered and written in one executemany once
+# this many samples have built up, this much time has passed, or gpu_status
+# has to be written anyway. Each row is queued as
+# (seq, sampled_at, metrics, deployment_id): sampled_at keeps the row's own time
+# rather than the flush's, and seq lets a flush remove exactly the rows it
+# wrote, even if the bounded queue dropped older ones while the write was in
+# flight.
+GPU_METRICS_FLUSH_SIZE = 6
+GPU_METRICS_FLUSH_SECONDS = 60
+_pending_gpu_metrics = deque(maxlen=360)
+_gpu_metrics_seq = itertools.count()
+_last_gpu_metrics_flush = time.monotonic()
+
+async def flush_gpu_metrics(status_fields: Optional[Dict[str, Any]] = None) -> bool:
+    """Write buffered gpu_metrics rows, plus any gpu_status change, in one transaction."""
+    global _last_gpu_metrics_flush
+    batch = list(_pending_gpu_metrics)
+    if not batch and status_fields is None:
+        return True
+    
+    stored = await upsert_gpu_state('gpu-0', status_fields,
+                                    metrics_batch=[row[1:] for row in batch])
+    if stored:
+        # Samples appended while the write was in flight stay queued
+        if batch:
+            last_seq = batch[-1][0]
+            while _pending_gpu_metrics and _pending_gpu_metrics[0][0] <= last_seq:
+                _pending_gpu_metrics.popleft()
+        _last_gpu_metrics_flush = time.monotonic()
+    return stored
+
+# Expired deployments torn down at once by the duration monitor
+MAX_CONCURRENT_TERMINATIONS = 4
+
+# There is one GPU: a deploy holds this from its availability check until the
+# GPU is marked busy (and through the rest of the setup), so two deploys can
+# never both see it free
+_deploy_lock = asyncio.Lock()
+
+def command_deployment_id(command: Dict[str, Any]) -> Optional[str]:
+    """The deployment a command acts on (deploys use their command id)."""
+    if command.get('command_type') == 'deploy':
+        return command.get('command_id')
+    return (command.get('payload') or {}).get('deployment_id')
 
-async def start_health_monitoring(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 2: GPU Health Check - Check GPU health every interval seconds."""
-    logger.info("GPU health monitoring thread started")
+def command_batches(commands: list) -> list:
+    """Split one poll into batches that run one after another, in poll order.
+
+    Each deploy is a batch of its own; the other commands between deploys run
+    together, except that a second command for the same deployment starts a
+    new batch so it still runs after the first.
+    """
+    batches, current, seen = [], [], set()
+    for command in commands:
+        deployment_id = command_deployment_id(command)
+        is_deploy = command.get('command_type') == 'deploy'
+        if current and (is_deploy or (deployment_id is not None and deployment_id in seen)):
+            batches.append(current)
+            current, seen = [], set()
+        if is_deploy:
+            batches.append([command])
+            continue
+        current.append(command)
+        if deployment_id is not None:
+            seen.add(deployment_id)
+    if current:
+        batches.append(current)
+    return batches
+
+class MonitorScheduler:
+    """Run all periodic monitoring jobs off a single timer.
+
+    Jobs are scheduled at a fixed rate (start + interval), and every job due
+    within COALESCE_WINDOW of the earliest deadline is started in the same
+    wake-up, so jobs sharing an interval stay in step and read each other's
+    cached samples. A job is never started again while its previous tick is
+    still running; a tick that overruns its interval runs again right after.
+    Ticks log their own errors and re-raise them; a tick that raises waits
+    twice as long after each failure in a row (up to MAX_FAILURE_BACKOFF)
+    until it succeeds again.
+    
+    Adaptive jobs return whether their readings changed. After
+    IDLE_TICKS_BEFORE_STRETCH unchanged ticks their interval doubles, up to
+    max_interval, and the first change puts it straight back.
+    """
+    
+    COALESCE_WINDOW = 0.5
+    MAX_FAILURE_BACKOFF = 300
+    IDLE_TICKS_BEFORE_STRETCH = 3
+    
+    def __init__(self, config: Dict[str, Any], agent_id: str):
+        self.config = config
+        self.agent_id = agent_id
+        self.jobs = []
+        self._wakeup = asyncio.Event()
     
-    while True:
+    def add(self, name: str, tick, interval: int, max_interval: int = None):
+        """Register a tick function to run every interval seconds (up to max_interval while idle)."""
+        self.jobs.append({'name': name, 'tick': tick, 'interval': interval,
+                          'base_interval': interval, 'max_interval': max_interval or interval,
+                          'quiet_ticks': 0, 'next_due': time.monotonic(), 'task': None, 'failures': 0})
+    
+    def _adapt(self, job: Dict[str, Any], changed: Optional[bool]):
+        # None means the tick has no opinion on whether anything changed
+        if changed is None or job['max_interval'] == job['base_interval']:
+            return
+        if changed:
+            job['quiet_ticks'] = 0
+            if job['interval'] != job['base_interval']:
+                job['interval'] = job['base_interval']
+                job['next_due'] = min(job['next_due'], time.monotonic() + job['interval'])
+                logger.debug(f"{job['name']} back to every {job['interval']}s")
+            return
+        job['quiet_ticks'] += 1
+        if job['quiet_ticks'] >= self.IDLE_TICKS_BEFORE_STRETCH and job['interval'] < job['max_interval']:
+            job['quiet_ticks'] = 0
+            job['interval'] = min(job['interval'] * 2, job['max_interval'])
+            logger.debug(f"{job['name']} idle, now every {job['interval']}s")
+    
+    async def _run(self, job: Dict[str, Any]):
         try:
-            # Perform health check
-            health_data = check_gpu_health()
-            
-            # Store health check results
-            await store_health_check('gpu-0', health_data)
-            
-            # Update GPU health status
-            await update_gpu_status('gpu-0',
-                is_healthy=(health_data['health_status'] == 'healthy'),
-                last_health_check=datetime.now(),
-                consecutive_failures=0 if health_data['health_status'] == 'healthy' else 1
-            )
-            
-            if health_data['health_status'] != 'healthy':
-                logger.warning(f"GPU health check failed: {health_data['error_message']}")
+            changed = await job['tick'](self.config, self.agent_id, job['interval'])
+            job['failures'] = 0
+            self._adapt(job, changed)
+        except Exception:
+            # The tick has already logged what went wrong
+            job['failures'] += 1
+            backoff = max(min(job['interval'] * 2 ** job['failures'], self.MAX_FAILURE_BACKOFF), job['interval'])
+            job['next_due'] = max(job['next_due'], time.monotonic() + backoff)
+            logger.warning(f"{job['name']} failed {job['failures']} time(s) in a row, next try in {backoff}s")
+        finally:
+            self._wakeup.set()
+    
+    async def shutdown(self):
+        """Cancel any ticks still running and wait for them to finish."""
+        running = [job['task'] for job in self.jobs if job['task'] is not None and not job['task'].done()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+    
+    async def run(self):
+        """Start due jobs, then sleep until the next deadline or a job finishing."""
+        global _wave_time
+        while True:
+            now = time.monotonic()
+            idle = [job for job in self.jobs if job['task'] is None or job['task'].done()]
+            if idle and min(job['next_due'] for job in idle) <= now:
+                _wave_time = datetime.now(timezone.utc)
+                for job in idle:
+                    if job['next_due'] <= now + self.COALESCE_WINDOW:
+                        job['next_due'] = max(job['next_due'] + job['interval'], now)
+                        job['task'] = asyncio.create_task(self._run(job), name=job['name'])
             
-        except Exception as e:
-            logger.error(f"Error in health monitoring: {e}")
+            idle = [job for job in self.jobs if job['task'] is None or job['task'].done()]
+            timeout = min((job['next_due'] for job in idle), default=now + 60) - time.monotonic()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+async def tick_gpu_monitoring(config: Dict[str, Any], agent_id: str, interval: int) -> Optional[bool]:
+    """GPU Monitoring - Collect GPU metrics (returns whether gpu_status moved)."""
+    try:
+        # Collect GPU metrics and the current deployment ID (if any) together
+        metrics, gpu_status = await asyncio.gather(
+            _metrics_cache.get('gpu', interval),
+            get_gpu_status()
+        )
+        deployment_id = gpu_status.get('current_deployment_id') if gpu_status else None
         
-        await asyncio.sleep(interval)
+        # Always keep the history row; only touch gpu_status when a reading moved
+        status_fields = {key: metrics[key] for key in GPU_STATUS_THRESHOLDS}
+        if not gpu_status_changed(status_fields):
+            status_fields = None
+        
+        # Buffer the history row; write the batch (and any status change) in one transaction
+        _pending_gpu_metrics.append((next(_gpu_metrics_seq), datetime.now(), metrics, deployment_id))
+        if (status_fields is not None
+                or len(_pending_gpu_metrics) >= GPU_METRICS_FLUSH_SIZE
+                or time.monotonic() - _last_gpu_metrics_flush >= GPU_METRICS_FLUSH_SECONDS):
+            stored = await flush_gpu_metrics(status_fields)
+            if not stored:
+                raise RuntimeError("GPU metrics could not be stored")
+            if status_fields is not None:
+                _last_gpu_status.update(fields=status_fields, at=time.monotonic())
+        
+        # Lazy %-formatting: this runs every tick and is discarded at INFO
+        logger.debug("GPU metrics collected: %.1f%% utilization", metrics['gpu_utilization'])
+        return status_fields is not None
+        
+    except Exception as e:
+        logger.error(f"Error in GPU monitoring: {e}")
+        raise  # Counted by the scheduler for backoff
 
-async def start_heartbeat(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 3: Heartbeat - Send heartbeat to central server every interval seconds."""
-    logger.info("Heartbeat thread started")
-    
-    while True:
-        try:
-            # Send heartbeat to server
+async def tick_health_monitoring(config: Dict[str, Any], agent_id: str, interval: int):
+    """GPU Health Check - Check GPU health."""
+    try:
+        # Perform health check
+        health_data = await _metrics_cache.get('health', interval)
+        
+        # Store health check results and update GPU health status together
+        stored = await upsert_gpu_state('gpu-0', {
+            'is_healthy': health_data['health_status'] == 'healthy',
+            'last_health_check': datetime.now(),
+            'consecutive_failures': 0 if health_data['health_status'] == 'healthy' else 1
+        }, health_data=health_data)
+        if not stored:
+            raise RuntimeError("Health check could not be stored")
+        
+        if health_data['health_status'] != 'healthy':
+            logger.warning(f"GPU health check failed: {health_data['error_message']}")
+        
+    except Exception as e:
+        logger.error(f"Error in health monitoring: {e}")
+        raise  # Counted by the scheduler for backoff
+
+async def tick_heartbeat(config: Dict[str, Any], agent_id: str, interval: int):
+    """Heartbeat - Send heartbeat to central server."""
+    try:
+        # Send heartbeat to server (or hand it to the next telemetry batch)
+        if batching_enabled(config):
+            queue_telemetry('heartbeat', heartbeat_payload(agent_id))
+        else:
             await send_heartbeat(config, agent_id)
             logger.debug("Heartbeat sent to server")
-            
-        except Exception as e:
-            logger.error(f"Error sending heartbeat: {e}")
         
-        await asyncio.sleep(interval)
+    except Exception as e:
+        logger.error(f"Error sending heartbeat: {e}")
+        raise  # Counted by the scheduler for backoff
 
-async def start_command_polling(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 4: Command Polling - Poll for commands from central server every interval seconds."""
-    logger.info("Command polling thread started")
+async def tick_command_polling(config: Dict[str, Any], agent_id: str, interval: int):
+    """Command Polling - Poll for commands from central server."""
+    # Seconds the server may hold a poll open until a command arrives (0 = plain polling).
+    # A held poll that outlasts the interval is simply re-issued as soon as it returns.
+    long_poll = config['monitoring'].get('command_long_poll', 0)
     
-    while True:
-        try:
-            # Poll for commands
-            commands = await poll_commands(config, agent_id)
+    try:
+        # Poll for commands
+        commands = await poll_commands(config, agent_id, wait=long_poll)
+        
+        if commands:
+            logger.info(f"Received {len(commands)} commands")
             
-            if commands:
-                logger.info(f"Received {len(commands)} commands")
-                
-                # Process each command
-                for command in commands:
-                    await process_command(config, agent_id, command)
+            # Run the commands in poll order (independent ones within a batch
+            # concurrently), then acknowledge the whole poll in one request
+            processed = []
+            for batch in command_batches(commands):
+                results = await asyncio.gather(
+                    *(process_command(config, agent_id, command) for command in batch),
+                    return_exceptions=True
+                )
+                processed.extend(command_id for command_id in results
+                                 if command_id and not isinstance(command_id, BaseException))
             
-        except Exception as e:
-            logger.error(f"Error in command polling: {e}")
+            if processed:
+                await acknowledge_commands(config, agent_id, processed)
         
-        await asyncio.sleep(interval)
+    except Exception as e:
+        logger.error(f"Error in command polling: {e}")
+        raise  # Counted by the scheduler for backoff
 
-async def start_metrics_push(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 5: Metrics Push - Push GPU metrics to central server every interval seconds."""
-    logger.info("Metrics push thread started")
-    
-    while True:
-        try:
-            # Collect GPU and system metrics
-            gpu_metrics = collect_gpu_metrics()
-            system_metrics = collect_system_metrics()
-            uptime_info = get_uptime_info()
-            gpu_status = await get_gpu_status()
+async def tick_metrics_push(config: Dict[str, Any], agent_id: str, interval: int) -> Optional[bool]:
+    """Metrics Push - Push GPU metrics to central server (returns whether the payload changed)."""
+    try:
+        # Collect GPU and system metrics concurrently
+        gpu_metrics, system_metrics, uptime_info, gpu_status = await asyncio.gather(
+            _metrics_cache.get('gpu', interval),
+            asyncio.to_thread(collect_system_metrics),
+            _metrics_cache.get('uptime', UPTIME_MAX_AGE),
+            get_gpu_status()
+        )
+        
+        # Prepare comprehensive metrics payload
+        payload = MetricsPayload(
+            agent_id=agent_id,
+            gpu_uuid=gpu_status.get('gpu_uuid') if gpu_status else None,
             
-            # Prepare comprehensive metrics payload
+            # GPU Performance Metrics
+            gpu_utilization=gpu_metrics['gpu_utilization'],
+            vram_used_mb=gpu_metrics['vram_used_mb'],
+            temperature_celsius=gpu_metrics['temperature_celsius'],
+            power_draw_watts=gpu_metrics['power_draw_watts'],
+            fan_speed_percent=gpu_metrics['fan_speed_percent'],
+            
+            # System Metrics
+            cpu_utilization=system_metrics['cpu_utilization'],
+            ram_used_gb=system_metrics['ram_used_gb'],
+            storage_used_gb=system_metrics['storage_used_gb'],
+            
+            # Network Metrics
+            network_utilization=system_metrics['network_utilization'],
+            current_upload_mbps=system_metrics['current_upload_mbps'],
+            current_download_mbps=system_metrics['current_download_mbps'],
+            
+            # Uptime
+            uptime_hours=uptime_info['uptime_hours'],
+            
+            timestamp=wave_time()
+        )
+        
+        # Queue the sample and push everything still pending, oldest first
+        if batching_enabled(config):
+            queue_telemetry('metrics', payload)
+            await flush_telemetry_batch(config, agent_id)
+        else:
+            _pending_metrics.append(payload)
+            await flush_pending_metrics(config)
+        
+        digest = metrics_digest(payload)
+        changed = digest != _last_metrics_digest['digest']
+        _last_metrics_digest['digest'] = digest
+        return changed
+        
+    except Exception as e:
+        logger.error(f"Error pushing metrics: {e}")
+        raise  # Counted by the scheduler for backoff
+
+async def tick_health_push(config: Dict[str, Any], agent_id: str, interval: int) -> Optional[bool]:
+    """Health Push - Push health status to central server (returns whether it changed)."""
+    # Nothing to push while the server is known to be down
+    if _server_circuit.is_open():
+        return
+    
+    try:
+        # Get current health status and metrics concurrently
+        gpu_status, health_data, gpu_metrics = await asyncio.gather(
+            get_gpu_status(),
+            _metrics_cache.get('health', interval),
+            _metrics_cache.get('gpu', interval)
+        )
+        
+        # Calculate performance scores
+        scores = calculate_health_scores(gpu_metrics, health_data)
+        
+        if gpu_status:
+            # Prepare comprehensive health payload
+            last_check = gpu_status.get('last_health_check')
             payload = {
                 'agent_id': agent_id,
-                'gpu_uuid': gpu_status.get('gpu_uuid') if gpu_status else None,
-                
-                # GPU Performance Metrics
-                'gpu_utilization': gpu_metrics['gpu_utilization'],
-                'vram_used_mb': gpu_metrics['vram_used_mb'],
-                'temperature_celsius': gpu_metrics['temperature_celsius'],
-                'power_draw_watts': gpu_metrics['power_draw_watts'],
-                'fan_speed_percent': gpu_metrics['fan_speed_percent'],
-                
-                # System Metrics
-                'cpu_utilization': system_metrics['cpu_utilization'],
-                'ram_used_gb': system_metrics['ram_used_gb'],
-                'storage_used_gb': system_metrics['storage_used_gb'],
+                'gpu_uuid': gpu_status.get('gpu_uuid'),
+                'is_healthy': gpu_status.get('is_healthy', False),
+                'status': gpu_status.get('status', 'unknown'),
                 
-                # Network Metrics
-                'network_utilization': system_metrics['network_utilization'],
-                'current_upload_mbps': system_metrics['current_upload_mbps'],
-                'current_download_mbps': system_metrics['current_download_mbps'],
+                # Health Details
+                'temperature_ok': health_data.get('temperature_normal', True),
+                'power_ok': health_data.get('power_normal', True),
+                'network_ok': True,  # Simplified - could add network check
+                'storage_ok': True,  # Simplified - could add storage check
                 
-                # Uptime
-                'uptime_hours': uptime_info['uptime_hours'],
+                # Performance Indicators
+                'gpu_performance_score': scores['gpu_performance_score'],
+                'system_stability_score': scores['system_stability_score'],
                 
-                'timestamp': datetime.now().isoformat()
+                'last_health_check': last_check,
+                'timestamp': wave_time()
             }
             
-            # Push to server
-            await push_metrics(config, payload)
-            logger.debug("Comprehensive metrics pushed to server")
-            
-        except Exception as e:
-            logger.error(f"Error pushing metrics: {e}")
-        
-        await asyncio.sleep(interval)
-
-async def start_health_push(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 6: Health Push - Push health status to central server every interval seconds."""
-    logger.info("Health push thread started")
-    
-    while True:
-        try:
-            # Get current health status and metrics
-            gpu_status = await get_gpu_status()
-            health_data = check_gpu_health()
-            gpu_metrics = collect_gpu_metrics()
-            
-            # Calculate performance scores
-            scores = calculate_health_scores(gpu_metrics, health_data)
-            
-            if gpu_status:
-                # Prepare comprehensive health payload
-                last_check = gpu_status.get('last_health_check')
-                payload = {
-                    'agent_id': agent_id,
-                    'gpu_uuid': gpu_status.get('gpu_uuid'),
-                    'is_healthy': gpu_status.get('is_healthy', False),
-                    'status': gpu_status.get('status', 'unknown'),
-                    
-                    # Health Details
-                    'temperature_ok': health_data.get('temperature_normal', True),
-                    'power_ok': health_data.get('power_normal', True),
-                    'network_ok': True,  # Simplified - could add network check
-                    'storage_ok': True,  # Simplified - could add storage check
-                    
-                    # Performance Indicators
-                    'gpu_performance_score': scores['gpu_performance_score'],
-                    'system_stability_score': scores['system_stability_score'],
-                    
-                    'last_health_check': last_check.isoformat() if last_check else None,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                # Push to server
-                await push_health(config, payload)
+            # Push to server only if the health picture changed or a resync is due
+            digest = health_digest(payload)
+            changed = digest != _last_health_push['digest']
+            if not changed and time.monotonic() - _last_health_push['at'] < HEALTH_RESYNC_SECONDS:
+                logger.debug("Health status unchanged, skipping push")
+            elif batching_enabled(config):
+                queue_telemetry('health', payload)
+                _last_health_push.update(digest=digest, at=time.monotonic())
+            elif await push_health(config, payload):
+                _last_health_push.update(digest=digest, at=time.monotonic())
                 logger.debug("Comprehensive health status pushed to server")
-            
-        except Exception as e:
-            logger.error(f"Error pushing health status: {e}")
+            return changed
         
-        await asyncio.sleep(interval)
+    except Exception as e:
+        logger.error(f"Error pushing health status: {e}")
+        raise  # Counted by the scheduler for backoff
 
-async def start_duration_monitor(config: Dict[str, Any], agent_id: str, interval: int):
-    """Thread 7: Duration Monitor - Check for expired deployments every interval seconds."""
-    logger.info("Duration monitor thread started")
-    
-    while True:
-        try:
-            # Check for expired deployments
-            expired_deployments = await get_expired_deployments()
+async def tick_duration_monitor(config: Dict[str, Any], agent_id: str, interval: int):
+    """Duration Monitor - Check for expired deployments."""
+    try:
+        # Check for expired deployments
+        expired_deployments = await get_expired_deployments()
+        
+        if expired_deployments:
+            logger.info(f"Found {len(expired_deployments)} expired deployments")
             
-            if expired_deployments:
-                logger.info(f"Found {len(expired_deployments)} expired deployments")
-                
-                for deployment in expired_deployments:
+            # Terminate them concurrently, a few at a time
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_TERMINATIONS)
+            
+            async def terminate(deployment):
+                async with semaphore:
                     logger.info(f"Auto-terminating expired deployment: {deployment['deployment_id']}")
-                    
-                    # Terminate the deployment
                     await terminate_deployment(
                         deployment['deployment_id'],
                         deployment['container_id'],
                         'duration_expired'
                     )
             
-        except Exception as e:
-            logger.error(f"Error in duration monitoring: {e}")
+            results = await asyncio.gather(
+                *(terminate(deployment) for deployment in expired_deployments),
+                return_exceptions=True
+            )
+            for deployment, result in zip(expired_deployments, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to terminate {deployment['deployment_id']}: {result}")
         
-        await asyncio.sleep(interval)
+    except Exception as e:
+        logger.error(f"Error in duration monitoring: {e}")
+        raise  # Counted by the scheduler for backoff
+
+def heartbeat_payload(agent_id: str) -> Dict[str, Any]:
+    """Build a heartbeat body."""
+    return {
+        'agent_id': agent_id,
+        'timestamp': wave_time(),
+        'status': 'online'
+    }
 
 async def send_heartbeat(config: Dict[str, Any], agent_id: str):
     """Send heartbeat to central server."""
+    if _server_circuit.is_open():
+        return
     try:
-        url = f"{config['server']['url']}/api/host-agents/{agent_id}/heartbeat"
-        headers = {
-            'Authorization': f"Bearer {config['agent']['api_key']}",
-            'Content-Type': 'application/json'
-        }
+        endpoints = get_endpoints(config)
         
-        payload = {
-            'agent_id': agent_id,
-            'timestamp': datetime.now().isoformat(),
-            'status': 'online'
-        }
+        payload = heartbeat_payload(agent_id)
         
-        response = requests.post(
-            url, 
-            json=payload, 
-            headers=headers, 
-            timeout=config['server']['timeout']
-        )
+        async with get_session().post(
+            endpoints.heartbeat, 
+            data=orjson.dumps(payload), 
+            headers=endpoints.headers, 
+            timeout=endpoints.timeout
+        ) as response:
+            status = response.status
         
-        if response.status_code != 200:
-            logger.warning(f"Heartbeat failed: {response.status_code}")
+        _server_circuit.record(status < 500)
+        if status != 200:
+            logger.warning(f"Heartbeat failed: {status}")
             
     except Exception as e:
+        _server_circuit.record(False)
         logger.error(f"Failed to send heartbeat: {e}")
 
-async def poll_commands(config: Dict[str, Any], agent_id: str) -> list:
-    """Poll for commands from central server."""
+async def poll_commands(config: Dict[str, Any], agent_id: str, wait: int = 0) -> list:
+    """Poll for commands from central server, letting it hold the request up to wait seconds."""
+    if _server_circuit.is_open():
+        return []
     try:
-        url = f"{config['server']['url']}/api/host-agents/{agent_id}/commands"
-        headers = {
-            'Authorization': f"Bearer {config['agent']['api_key']}",
-            'Content-Type': 'application/json'
-        }
+        endpoints = get_endpoints(config)
         
-        response = requests.get(
-            url, 
-            headers=headers, 
-            timeout=config['server']['timeout']
-        )
+        async with get_session().get(
+            endpoints.commands, 
+            params={'wait': wait} if wait else None,
+            headers=endpoints.headers, 
+            timeout=request_timeout(config['server']['timeout'] + wait) if wait else endpoints.timeout
+        ) as response:
+            status = response.status
+            body = await response.read()
         
-        if response.status_code == 200:
-            data = response.json()
+        _server_circuit.record(status < 500)
+        if status == 200:
+            data = orjson.loads(body)
             commands = data.get('commands', [])
-            logger.debug(f"Poll response: {response.text[:500]}")  # Log first 500 chars
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Poll response: {body[:500].decode(errors='replace')}")  # Log first 500 chars
             return commands
         else:
-            logger.warning(f"Command polling failed: {response.status_code} - {response.text[:200]}")
+            logger.warning(f"Command polling failed: {status} - {body[:200].decode(errors='replace')}")
             return []
             
     except Exception as e:
+        _server_circuit.record(False)
         logger.error(f"Failed to poll commands: {e}")
         return []
 
-async def process_command(config: Dict[str, Any], agent_id: str, command: Dict[str, Any]):
-    """Process a command from the central server."""
+async def process_command(config: Dict[str, Any], agent_id: str, command: Dict[str, Any]) -> Optional[str]:
+    """Process a command from the central server and return its id for acknowledgment."""
     command_id = None
     try:
         # Log raw command for debugging
-        import json
-        logger.info(f"Raw command received: {json.dumps(command, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Raw command received: {orjson.dumps(command).decode()}")
         
         command_type = command.get('command_type')  # Fixed: was 'type'
         command_data = command.get('payload', {})   # Fixed: was 'data'
@@ -313,11 +700,10 @@ async def process_command(config: Dict[str, Any], agent_id: str, command: Dict[s
         
     except Exception as e:
         logger.error(f"Error processing command: {e}")
-    finally:
-        # Always acknowledge command, even if it failed
-        # This prevents the server from re-sending the same command
-        if command_id:
-            await acknowledge_command(config, agent_id, command_id)
+    
+    # Always acknowledge command, even if it failed
+    # This prevents the server from re-sending the same command
+    return command_id
 
 async def handle_deploy_command(config: Dict[str, Any], command_id: str, command_data: Dict[str, Any]):
     """Handle DEPLOY command."""
@@ -338,7 +724,8 @@ async def handle_deploy_command(config: Dict[str, Any], command_id: str, command
     
     try:
         # Pass the full command_data so deployment can access image, ports, etc.
-        await deploy_container(config, deployment_id, command_data)
+        async with _deploy_lock:
+            await deploy_container(config, deployment_id, command_data)
         logger.info(f"Deployment successful: {deployment_id}")
     except Exception as e:
         logger.error(f"Deployment failed: {e}")
@@ -361,70 +748,189 @@ async def handle_terminate_command(config: Dict[str, Any], command_data: Dict[st
 async def acknowledge_command(config: Dict[str, Any], agent_id: str, command_id: str):
     """Acknowledge command processing."""
     try:
-        url = f"{config['server']['url']}/api/host-agents/{agent_id}/commands/{command_id}/ack"
-        headers = {
-            'Authorization': f"Bearer {config['agent']['api_key']}",
-            'Content-Type': 'application/json'
-        }
+        endpoints = get_endpoints(config)
         
         payload = {
             'status': 'processed',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now(timezone.utc)
         }
         
-        response = requests.post(
-            url, 
-            json=payload, 
-            headers=headers, 
-            timeout=config['server']['timeout']
-        )
+        async with get_session().post(
+            f"{endpoints.commands}/{command_id}/ack", 
+            data=orjson.dumps(payload), 
+            headers=endpoints.headers, 
+            timeout=endpoints.timeout
+        ) as response:
+            status = response.status
         
-        if response.status_code != 200:
-            logger.warning(f"Command acknowledgment failed: {response.status_code}")
+        if status != 200:
+            logger.warning(f"Command acknowledgment failed: {status}")
             
     except Exception as e:
         logger.error(f"Failed to acknowledge command: {e}")
 
-async def push_metrics(config: Dict[str, Any], payload: Dict[str, Any]):
-    """Push metrics to central server."""
+# Cleared once the server answers 404 on the bulk ack route; per-command acks are used from then on
+_bulk_ack_supported = True
+
+async def acknowledge_commands(config: Dict[str, Any], agent_id: str, command_ids: list):
+    """Acknowledge a batch of processed commands with a single request."""
+    global _bulk_ack_supported
+    if _bulk_ack_supported and len(command_ids) > 1:
+        try:
+            endpoints = get_endpoints(config)
+            
+            payload = {
+                'command_ids': command_ids,
+                'status': 'processed',
+                'timestamp': datetime.now(timezone.utc)
+            }
+            
+            async with get_session().post(
+                endpoints.commands_ack, 
+                data=orjson.dumps(payload), 
+                headers=endpoints.headers, 
+                timeout=endpoints.timeout
+            ) as response:
+                status = response.status
+            
+            if status == 200:
+                return
+            if status == 404:
+                logger.info("Server has no bulk command ack route, acknowledging commands individually")
+                _bulk_ack_supported = False
+            else:
+                logger.warning(f"Bulk command acknowledgment failed: {status}")
+                
+        except Exception as e:
+            logger.error(f"Failed to acknowledge commands: {e}")
+    
+    await asyncio.gather(*(acknowledge_command(config, agent_id, command_id) for command_id in command_ids))
+
+async def flush_pending_metrics(config: Dict[str, Any]):
+    """Push queued metrics samples until the queue is empty or a push fails."""
+    while _pending_metrics:
+        if not await push_metrics(config, _pending_metrics[0]):
+            logger.debug(f"{len(_pending_metrics)} metrics samples pending")
+            return
+        _pending_metrics.popleft()
+    
+    logger.debug("Comprehensive metrics pushed to server")
+
+async def push_metrics(config: Dict[str, Any], payload: MetricsPayload) -> bool:
+    """Push metrics to central server. Returns True if the server accepted them."""
+    if _server_circuit.is_open():
+        return False
     try:
-        url = f"{config['server']['url']}/api/host-agents/metrics"
-        headers = {
-            'Authorization': f"Bearer {config['agent']['api_key']}",
-            'Content-Type': 'application/json'
-        }
+        endpoints = get_endpoints(config)
         
-        response = requests.post(
-            url, 
-            json=payload, 
-            headers=headers, 
-            timeout=config['server']['timeout']
-        )
+        async with get_session().post(
+            endpoints.metrics, 
+            data=orjson.dumps(payload), 
+            headers=endpoints.headers, 
+            timeout=endpoints.timeout
+        ) as response:
+            status = response.status
+        
+        _server_circuit.record(status < 500)
+        if status != 200:
+            logger.warning(f"Metrics push failed: {status}")
+            return False
         
-        if response.status_code != 200:
-            logger.warning(f"Metrics push failed: {response.status_code}")
+        return True
             
     except Exception as e:
+        _server_circuit.record(False)
         logger.error(f"Failed to push metrics: {e}")
+        return False
+
+def batching_enabled(config: Dict[str, Any]) -> bool:
+    """Whether telemetry goes out through the batch endpoint."""
+    return bool(config['server'].get('batch_telemetry', False))
 
-async def push_health(config: Dict[str, Any], payload: Dict[str, Any]):
-    """Push health status to central server."""
+def queue_telemetry(kind: str, payload: Dict[str, Any]):
+    """Add a sample to the next telemetry batch, dropping the oldest if full."""
+    _telemetry_batch.append({'kind': kind, 'data': payload})
+    while len(_telemetry_batch) > MAX_PENDING_TELEMETRY:
+        _telemetry_batch.popleft()
+
+async def flush_telemetry_batch(config: Dict[str, Any], agent_id: str):
+    """Send queued telemetry in batches of up to MAX_BATCH samples."""
+    while _telemetry_batch:
+        batch = [_telemetry_batch.popleft() for _ in range(min(len(_telemetry_batch), MAX_BATCH))]
+        if not await push_telemetry_batch(config, agent_id, batch):
+            # Put the batch back in front of anything queued meanwhile
+            _telemetry_batch.extendleft(reversed(batch))
+            while len(_telemetry_batch) > MAX_PENDING_TELEMETRY:
+                _telemetry_batch.popleft()
+            logger.debug(f"{len(_telemetry_batch)} telemetry samples pending")
+            return
+    
+    logger.debug("Telemetry batch pushed to server")
+
+async def push_telemetry_batch(config: Dict[str, Any], agent_id: str, samples: list) -> bool:
+    """Push a batch of tagged samples. Returns True if the server accepted it."""
+    if _server_circuit.is_open():
+        return False
     try:
-        url = f"{config['server']['url']}/api/host-agents/health"
-        headers = {
-            'Authorization': f"Bearer {config['agent']['api_key']}",
-            'Content-Type': 'application/json'
-        }
+        endpoints = get_endpoints(config)
         
-        response = requests.post(
-            url, 
-            json=payload, 
-            headers=headers, 
-            timeout=config['server']['timeout']
-        )
+        async with get_session().post(
+            endpoints.telemetry_batch, 
+            data=orjson.dumps({'samples': samples}), 
+            headers=endpoints.headers, 
+            timeout=endpoints.timeout
+        ) as response:
+            status = response.status
+        
+        _server_circuit.record(status < 500)
+        if status != 200:
+            logger.warning(f"Telemetry batch push failed: {status}")
+            return False
+        
+        return True
+            
+    except Exception as e:
+        _server_circuit.record(False)
+        logger.error(f"Failed to push telemetry batch: {e}")
+        return False
+
+def metrics_digest(payload: MetricsPayload) -> bytes:
+    """Hash a metrics payload apart from its timestamp, readings rounded to whole units."""
+    stable = {}
+    for key in MetricsPayload.__slots__:
+        if key != 'timestamp':
+            value = getattr(payload, key)
+            stable[key] = round(value) if isinstance(value, float) else value
+    return hashlib.blake2b(orjson.dumps(stable), digest_size=16).digest()
+
+def health_digest(payload: Dict[str, Any]) -> bytes:
+    """Hash a health payload, ignoring fields that change on every tick."""
+    stable = {k: v for k, v in payload.items() if k not in _VOLATILE_HEALTH_KEYS}
+    return hashlib.blake2b(orjson.dumps(stable, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+async def push_health(config: Dict[str, Any], payload: Dict[str, Any]) -> bool:
+    """Push health status to central server. Returns True if the server accepted it."""
+    if _server_circuit.is_open():
+        return False
+    try:
+        endpoints = get_endpoints(config)
+        
+        async with get_session().post(
+            endpoints.health, 
+            data=orjson.dumps(payload), 
+            headers=endpoints.headers, 
+            timeout=endpoints.timeout
+        ) as response:
+            status = response.status
+        
+        _server_circuit.record(status < 500)
+        if status != 200:
+            logger.warning(f"Health push failed: {status}")
+            return False
         
-        if response.status_code != 200:
-            logger.warning(f"Health push failed: {response.status_code}")
+        return True
             
     except Exception as e:
+        _server_circuit.record(False)
         logger.error(f"Failed to push health status: {e}")
+        return False
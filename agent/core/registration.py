@@ -1,8 +1,12 @@
 # host-agent/agent/core/registration.py
+import asyncio
 import logging
 from typing import Any, Dict
 
-import requests
+import aiohttp
+import orjson
+
+from .http_client import get_session, request_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -19,17 +23,19 @@ async def register_with_server(config: Dict[str, Any], payload: Dict[str, Any])
         logger.info(f"Registration URL: {url}")
         logger.info(f"Payload: host_agent_id={payload.get('host_agent_id')}")
         
-        response = requests.post(
+        async with get_session().post(
             url,
-            json=payload,
+            data=orjson.dumps(payload),
             headers=headers,
-            timeout=config['server']['timeout']
-        )
+            timeout=request_timeout(config['server']['timeout'])
+        ) as response:
+            status = response.status
+            body = await response.read()
         
-        logger.info(f"Registration response status: {response.status_code}")
+        logger.info(f"Registration response status: {status}")
         
-        if response.status_code == 200:
-            result = response.json()
+        if status == 200:
+            result = orjson.loads(body)
             logger.info("Registration successful")
             return {
                 'success': True,
@@ -37,9 +43,9 @@ async def register_with_server(config: Dict[str, Any], payload: Dict[str, Any])
                 'message': result.get('message', 'Registration successful')
             }
             
-        elif response.status_code == 409:
+        elif status == 409:
             # Already registered
-            result = response.json()
+            result = orjson.loads(body)
             logger.info("Already registered")
             return {
                 'success': True,
@@ -47,36 +53,36 @@ async def register_with_server(config: Dict[str, Any], payload: Dict[str, Any])
                 'message': 'Already registered'
             }
             
-        elif response.status_code == 401:
-            logger.error(f"Invalid API key - Server response: {response.text}")
+        elif status == 401:
+            logger.error(f"Invalid API key - Server response: {body.decode(errors='replace')}")
             return {
                 'success': False,
                 'error': 'Invalid API key'
             }
             
-        elif response.status_code == 422:
+        elif status == 422:
             logger.error("Invalid configuration data")
-            error_msg = response.json().get('error', 'Invalid configuration data')
+            error_msg = orjson.loads(body).get('error', 'Invalid configuration data')
             return {
                 'success': False,
                 'error': error_msg
             }
             
         else:
-            logger.error(f"Registration failed with status: {response.status_code}")
+            logger.error(f"Registration failed with status: {status}")
             return {
                 'success': False,
-                'error': f'Registration failed: {response.status_code}'
+                'error': f'Registration failed: {status}'
             }
             
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logger.error("Registration timeout")
         return {
             'success': False,
             'error': 'Registration timeout'
         }
         
-    except requests.exceptions.ConnectionError:
+    except aiohttp.ClientConnectionError:
         logger.error("Cannot connect to central server")
         return {
             'success': False,
@@ -4,5 +4,5 @@ import uuid
 # Generate a unique ID for this specific agent instance on startup
 agent_instance_id = str(uuid.uuid4())
 
-# Store active WebSocket connections
-websocket_connections = {}
+# The server WebSocket for this agent (one per process), None while disconnected
+current_ws = None
@@ -1,6 +1,7 @@
+import asyncio
 import logging
 import os
-import random
+import threading
 import uuid
 
 import docker
@@ -10,6 +11,63 @@ from ..api.schemas import InstanceData
 client = docker.from_env()
 logger = logging.getLogger(__name__)
 
+# Images known to be present locally; a pull still hits the registry even on a
+# warm cache, so it only happens for images docker doesn't have yet.
+# (containers.run pulls on its own if one has since been pruned.)
+_local_images = set()
+
+def ensure_image(image_name: str):
+    """Pull image_name unless it is already present locally."""
+    if image_name in _local_images:
+        return
+    try:
+        client.images.get(image_name)
+    except docker.errors.ImageNotFound:
+        client.images.pull(image_name)
+    _local_images.add(image_name)
+
+# Host ports handed out to rental containers. Each container carries its ports
+# as labels, so the ports in use are whatever running rental containers are
+# labelled with; containers that exit (auto_remove) give theirs back by
+# disappearing. Ports handed out for a container that is not running yet are
+# held in the reserved sets meanwhile.
+SSH_PORT_LABEL = 'taolie.ssh_port'
+WEB_PORT_LABEL = 'taolie.web_port'
+SSH_PORT_RANGE = range(22000, 23000)
+WEB_PORT_RANGE = range(8000, 9000)
+_reserved_ssh_ports = set()
+_reserved_web_ports = set()
+_port_lock = threading.Lock()
+
+def allocate_rental_ports() -> tuple:
+    """Reserve an unused (ssh_port, web_port) pair (blocking Docker API call; run it in a thread)."""
+    with _port_lock:
+        used_ssh = set(_reserved_ssh_ports)
+        used_web = set(_reserved_web_ports)
+        for container in client.containers.list(filters={'label': SSH_PORT_LABEL}):
+            labels = container.labels
+            used_ssh.add(int(labels[SSH_PORT_LABEL]))
+            if WEB_PORT_LABEL in labels:
+                used_web.add(int(labels[WEB_PORT_LABEL]))
+        
+        free_ssh = set(SSH_PORT_RANGE) - used_ssh
+        free_web = set(WEB_PORT_RANGE) - used_web
+        if not free_ssh or not free_web:
+            raise RuntimeError("No free rental ports: every port in the SSH or web range is in use")
+        
+        ssh_port, web_port = min(free_ssh), min(free_web)
+        _reserved_ssh_ports.add(ssh_port)
+        _reserved_web_ports.add(web_port)
+        return ssh_port, web_port
+
+def release_rental_ports(labels: dict):
+    """Drop a reservation once its container holds the ports (or failed to start)."""
+    with _port_lock:
+        if SSH_PORT_LABEL in labels:
+            _reserved_ssh_ports.discard(int(labels[SSH_PORT_LABEL]))
+        if WEB_PORT_LABEL in labels:
+            _reserved_web_ports.discard(int(labels[WEB_PORT_LABEL]))
+
 async def start_container(instance_data: dict, instance_uuid: str, send_live_update) -> dict:
     """Starts a new GPU-enabled container based on instance_data with live updates."""
     # Build the command to set up SSH access for the user
@@ -18,13 +76,14 @@ async def start_container(instance_data: dict, instance_uuid: str, send_live_upd
     await send_live_update("Pulling Docker image...", instance_uuid)
     image_name = instance_data['image_name']
     try:
-        client.images.pull(image_name)
+        await asyncio.to_thread(ensure_image, image_name)
     except docker.errors.ImageNotFound:
         await send_live_update(f"Image '{image_name}' not found.", instance_uuid)
         raise
     
     await send_live_update("Starting container...", instance_uuid)
-    container = client.containers.run(
+    container = await asyncio.to_thread(
+        client.containers.run,
         image_name,
         detach=True,
         tty=True,
@@ -41,66 +100,92 @@ async def start_container(instance_data: dict, instance_uuid: str, send_live_upd
     logger.info(f"Container {container.id} started on GPU {instance_data['gpu_uuid']}")
     return container.attrs
 
+def abandon_pull(pull: asyncio.Task):
+    """Stop waiting for an image pull without leaving its result unretrieved.
+
+    The pull runs in a worker thread that cancelling would not stop, so it is
+    left to finish on its own and its outcome is consumed when it does.
+    """
+    pull.add_done_callback(lambda task: task.cancelled() or task.exception())
+
 async def start_rental_container(container_config: dict, rental_id: str, send_live_update) -> dict:
     """Starts a rental container with specific configuration."""
     try:
-        # Generate random ports for SSH and web access
-        ssh_port = random.randint(22000, 22999)
-        web_port = random.randint(8000, 8999)
-        
-        # Build command based on auth type
-        if container_config['auth_type'] == 'password':
-            password = container_config['password']
-            command = "/bin/bash -c 'echo root:" + password + " | chpasswd && /usr/sbin/sshd -D'"
-        else:  # public_key
-            ssh_key = container_config['ssh_key']
-            command = "/bin/bash -c 'mkdir -p /root/.ssh && echo \"" + ssh_key + "\" >> /root/.ssh/authorized_keys && chmod 600 /root/.ssh/authorized_keys && /usr/sbin/sshd -D'"
-        
-        # Set up environment variables
-        env_vars = container_config.get('environment_variables', {})
-        env_vars.update({
-            'CUDA_VISIBLE_DEVICES': '0',
-            'RENTAL_ID': rental_id
-        })
-        
+        # Pull the image in the background while the container settings are built
         await send_live_update("Pulling Docker image...", rental_id)
         image_name = container_config['image_name']
+        pull = asyncio.create_task(asyncio.to_thread(ensure_image, image_name))
+        
         try:
-            client.images.pull(image_name)
-        except docker.errors.ImageNotFound:
-            await send_live_update(f"Image '{image_name}' not found.", rental_id)
+            # Take free ports for SSH and web access
+            ssh_port, web_port = await asyncio.to_thread(allocate_rental_ports)
+        except Exception:
+            abandon_pull(pull)
             raise
+        port_labels = {SSH_PORT_LABEL: str(ssh_port), WEB_PORT_LABEL: str(web_port)}
         
-        await send_live_update("Starting rental container...", rental_id)
-        
-        # Set up port mappings
-        port_mappings = container_config.get('port_mappings', {})
-        ports = {
-            '22/tcp': ssh_port,
-            '8080/tcp': web_port
-        }
-        
-        # Add custom port mappings
-        for host_port, container_port in port_mappings.items():
-            ports[f'{container_port}/tcp'] = int(host_port)
+        try:
+            # Build command based on auth type
+            if container_config['auth_type'] == 'password':
+                password = container_config['password']
+                command = "/bin/bash -c 'echo root:" + password + " | chpasswd && /usr/sbin/sshd -D'"
+            else:  # public_key
+                ssh_key = container_config['ssh_key']
+                command = "/bin/bash -c 'mkdir -p /root/.ssh && echo \"" + ssh_key + "\" >> /root/.ssh/authorized_keys && chmod 600 /root/.ssh/authorized_keys && /usr/sbin/sshd -D'"
+            
+            # Set up environment variables
+            env_vars = container_config.get('environment_variables', {})
+            env_vars.update({
+                'CUDA_VISIBLE_DEVICES': '0',
+                'RENTAL_ID': rental_id
+            })
+            
+            # Set up port mappings
+            port_mappings = container_config.get('port_mappings', {})
+            ports = {
+                '22/tcp': ssh_port,
+                '8080/tcp': web_port
+            }
+            
+            # Add custom port mappings
+            for host_port, container_port in port_mappings.items():
+                ports[f'{container_port}/tcp'] = int(host_port)
+        except Exception:
+            abandon_pull(pull)
+            release_rental_ports(port_labels)
+            raise
         
-        container = client.containers.run(
-            image_name,
-            detach=True,
-            tty=True,
-            command=command,
-            name=f"rental-{rental_id}",
-            environment=env_vars,
-            ports=ports,
-            device_requests=[
-                docker.types.DeviceRequest(
-                    device_ids=[container_config['gpu_uuid']], 
-                    capabilities=[['gpu']]
-                )
-            ],
-            mem_limit=f"{container_config['memory_limit_mb']}m",
-            auto_remove=True
-        )
+        try:
+            try:
+                await pull
+            except docker.errors.ImageNotFound:
+                await send_live_update(f"Image '{image_name}' not found.", rental_id)
+                raise
+            
+            await send_live_update("Starting rental container...", rental_id)
+            
+            container = await asyncio.to_thread(
+                client.containers.run,
+                image_name,
+                detach=True,
+                tty=True,
+                command=command,
+                name=f"rental-{rental_id}",
+                environment=env_vars,
+                ports=ports,
+                labels=port_labels,
+                device_requests=[
+                    docker.types.DeviceRequest(
+                        device_ids=[container_config['gpu_uuid']], 
+                        capabilities=[['gpu']]
+                    )
+                ],
+                mem_limit=f"{container_config['memory_limit_mb']}m",
+                auto_remove=True
+            )
+        finally:
+            # From here on the container's labels (or nothing) hold the ports
+            release_rental_ports(port_labels)
         
         # Add port information to container attributes
         container_attrs = container.attrs.copy()
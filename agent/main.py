@@ -1,95 +1,190 @@
 # host-agent/agent/main.py
 import asyncio
+import atexit
+import errno
+import ipaddress
+import json
 import logging
 import os
+import queue
+import signal
+import socket
+import subprocess
 import sys
+import tempfile
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Dict
 
-import yaml
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
-from .core.database import (cleanup_database, create_deployment,
+from .core.database import (bulk_update_deployment_status,
+                            cleanup_database, create_deployment,
                             get_expired_deployments, get_gpu_status,
-                            init_database, store_gpu_metrics, store_gpu_status,
-                            store_health_check, update_deployment_status,
-                            update_gpu_status)
+                            init_database, load_config, save_config,
+                            store_gpu_metrics, store_gpu_status,
+                            store_health_check, update_gpu_status)
 from .core.deployment import deploy_container, terminate_deployment
 from .core.hardware import (calculate_health_scores, collect_gpu_metrics,
                             collect_system_metrics,
                             get_comprehensive_system_info, get_gpu_info,
                             get_host_info, get_uptime_info)
-from .core.monitoring import (start_command_polling, start_duration_monitor,
-                              start_gpu_monitoring, start_health_monitoring,
-                              start_health_push, start_heartbeat,
-                              start_metrics_push)
+from .core.http_client import (close_session, get_session,
+                               request_timeout)
+from .core.monitoring import (MonitorScheduler, batching_enabled,
+                              flush_gpu_metrics, tick_command_polling,
+                              tick_duration_monitor, tick_gpu_monitoring,
+                              tick_health_monitoring, tick_health_push,
+                              tick_heartbeat, tick_metrics_push)
 from .core.registration import register_with_server
 
-# Configure logging
+# Configure logging: records are queued and written by a background thread
+# so console and file I/O never run on the event loop
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(
+    log_queue,
+    logging.StreamHandler(sys.stdout),
+    logging.FileHandler('/var/log/taolie-host-agent/agent.log')
+)
+log_listener.start()
+atexit.register(log_listener.stop)  # Drains the queue on exit
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('/var/log/taolie-host-agent/agent.log')
-    ]
+    handlers=[QueueHandler(log_queue)]
 )
 logger = logging.getLogger(__name__)
 
+# Settings the agent can't run without, as (dotted name, key path)
+REQUIRED_CONFIG_FIELDS = tuple((field, tuple(field.split('.'))) for field in (
+    'agent.api_key',
+    'network.public_ip',
+    'network.ports.ssh',
+    'network.ports.rental_port_1',
+    'network.ports.rental_port_2'
+))
+
+# Example values shipped in config.yaml that must be replaced
+CONFIG_PLACEHOLDERS = frozenset({"your-api-key-here", "123.45.67.89"})
+
+# bind() errors meaning another socket holds the port (Windows reports WSAEADDRINUSE)
+ADDR_IN_USE_ERRNOS = frozenset({errno.EADDRINUSE, getattr(errno, 'WSAEADDRINUSE', errno.EADDRINUSE)})
+
+# Longest the startup banner waits on the gpu_status row before using the last snapshot
+BANNER_STATUS_TIMEOUT = 0.5
+
+# Public IP as last seen by ifconfig.me. It is looked up again on every start
+# (a changed IP is exactly what the check is for); the saved answer is only
+# used when that lookup fails and is younger than PUBLIC_IP_TTL
+PUBLIC_IP_CACHE = '/var/lib/taolie-host-agent/public_ip.json'
+PUBLIC_IP_TTL = 3600
+
+def load_cached_public_ip():
+    """Return the cached public IP if it is younger than PUBLIC_IP_TTL."""
+    try:
+        with open(PUBLIC_IP_CACHE, 'r') as f:
+            cached = json.load(f)
+        if time.time() - cached['checked_at'] < PUBLIC_IP_TTL:
+            return cached['ip']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def save_public_ip(ip: str):
+    """Persist the detected public IP for later restarts."""
+    try:
+        os.makedirs(os.path.dirname(PUBLIC_IP_CACHE), exist_ok=True)
+        tmp_path = f"{PUBLIC_IP_CACHE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'checked_at': time.time(), 'ip': ip}, f)
+        os.replace(tmp_path, PUBLIC_IP_CACHE)
+    except OSError as e:
+        logger.debug(f"Could not cache public IP: {e}")
+
+def same_ip(a: str, b: str) -> bool:
+    """Compare two IP addresses by value (so '::ffff:1.2.3.4' matches '1.2.3.4')."""
+    try:
+        ip_a, ip_b = ipaddress.ip_address(a.strip()), ipaddress.ip_address(b.strip())
+    except ValueError:
+        # Not both literal addresses (e.g. a hostname); fall back to the text
+        return a.strip() == b.strip()
+    return (getattr(ip_a, 'ipv4_mapped', None) or ip_a) == (getattr(ip_b, 'ipv4_mapped', None) or ip_b)
+
+def write_dashboard(path: str, html_content: str):
+    """Replace the dashboard file atomically, leaving it untouched if the page is unchanged."""
+    try:
+        with open(path, 'r') as f:
+            if f.read() == html_content:
+                logger.info(f"Dashboard up to date: {path}")
+                return
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    
+    # Write alongside and rename so a web server never serves a half-written page
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or '.', delete=False) as f:
+        try:
+            f.write(html_content)
+        except Exception:
+            os.unlink(f.name)
+            raise
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, path)
+    logger.info(f"Dashboard generated: {path}")
+
+async def gather_or_cancel(*aws):
+    """Run aws concurrently; on the first failure cancel and await the rest, then re-raise."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
 class TAOLIEHostAgent:
     def __init__(self):
         self.config = None
         self.agent_id = None
         self.gpu_uuid = None
+        self.last_gpu_status = None
         self.running = False
+        self.scheduler = None
+        self.scheduler_task = None
+        self.stop_event = asyncio.Event()
         
     def load_config(self):
         """Load configuration from YAML file."""
-        config_path = "/etc/taolie-host-agent/config.yaml"
-        if not os.path.exists(config_path):
-            config_path = "config.yaml"  # Fallback for development
-        
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config()
         
         logger.info("Configuration loaded successfully")
         
     def validate_config(self):
         """Validate configuration settings."""
-        required_fields = [
-            'agent.api_key',
-            'network.public_ip',
-            'network.ports.ssh',
-            'network.ports.rental_port_1',
-            'network.ports.rental_port_2'
-        ]
-        
-        for field in required_fields:
-            keys = field.split('.')
+        for field, keys in REQUIRED_CONFIG_FIELDS:
             value = self.config
             for key in keys:
                 if key not in value:
                     raise ValueError(f"Missing required configuration: {field}")
                 value = value[key]
             
-            if not value or value == "your-api-key-here" or value == "123.45.67.89":
+            if not value or value in CONFIG_PLACEHOLDERS:
                 raise ValueError(f"Configuration {field} must be set to a valid value")
         
         logger.info("Configuration validation passed")
         
-    def generate_agent_id(self):
+    async def generate_agent_id(self):
         """Generate or load agent ID."""
         if not self.config['agent']['id']:
-            import secrets
-            self.agent_id = f"agent-{secrets.token_hex(6)}"
+            self.agent_id = f"agent-{os.urandom(6).hex()}"
             
             # Update config file
             self.config['agent']['id'] = self.agent_id
-            config_path = "/etc/taolie-host-agent/config.yaml"
-            if not os.path.exists(config_path):
-                config_path = "config.yaml"
-            
-            with open(config_path, 'w') as f:
-                yaml.dump(self.config, f, default_flow_style=False)
+            await asyncio.to_thread(save_config, self.config)
             
             logger.info(f"Generated new agent ID: {self.agent_id}")
         else:
@@ -98,19 +193,27 @@ class TAOLIEHostAgent:
     
     async def test_network_config(self):
         """Test network configuration and port availability."""
-        import socket
-
         # Test public IP
         current_ip = None
+        source = "current IP"
         try:
-            import requests
-            current_ip = requests.get('https://ifconfig.me', timeout=5).text.strip()
-        except:
-            pass
+            async with get_session().get('https://ifconfig.me', timeout=request_timeout(5)) as response:
+                if response.status != 200:
+                    raise ValueError(f"HTTP {response.status}")
+                answer = (await response.text()).strip()
+            # Rate-limit and error pages come back as HTML; only keep a real address
+            ipaddress.ip_address(answer)
+            current_ip = answer
+            save_public_ip(current_ip)
+        except Exception as e:
+            # Timeout, no route out or a bad answer; the IP check is advisory only
+            logger.debug(f"Could not determine public IP: {e}")
+            current_ip = load_cached_public_ip()
+            source = "last detected IP"
         
         configured_ip = self.config['network']['public_ip']
-        if current_ip and current_ip != configured_ip:
-            logger.warning(f"Your current IP ({current_ip}) doesn't match configured IP ({configured_ip})")
+        if current_ip and not same_ip(current_ip, configured_ip):
+            logger.warning(f"Your {source} ({current_ip}) doesn't match configured IP ({configured_ip})")
             logger.warning(f"Renters will try to connect to: {configured_ip}")
         
         # Test port availability
@@ -120,22 +223,37 @@ class TAOLIEHostAgent:
             self.config['network']['ports']['rental_port_2']
         ]
         
+        # Binding is what the rental containers will need to do, and unlike a
+        # connect probe it returns at once and also catches bound-but-firewalled ports
         for port in ports:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex(('localhost', port))
-            sock.close()
-            
-            if result == 0:
+            if sys.platform == 'win32':
+                # SO_REUSEADDR on Windows lets the bind share a port another
+                # process is listening on; exclusive use makes it fail instead
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+            else:
+                # Ignore TIME_WAIT leftovers from a previous run; a listener still fails the bind
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(('0.0.0.0', port))
+            except OSError as e:
+                if e.errno not in ADDR_IN_USE_ERRNOS:
+                    # e.g. EACCES for a privileged port; the port may well be free
+                    logger.warning(f"Could not check port {port}: {e.strerror}")
+                    continue
                 logger.error(f"Port {port} is already in use")
                 raise ValueError(f"Port {port} is already in use")
-            else:
-                logger.info(f"Port {port} is available")
+            finally:
+                sock.close()
+            
+            logger.info(f"Port {port} is available")
     
     async def collect_system_info(self):
         """Collect GPU and host information."""
-        gpu_info = get_gpu_info()
-        host_info = get_host_info()
+        gpu_info, host_info = await asyncio.gather(
+            asyncio.to_thread(get_gpu_info),
+            asyncio.to_thread(get_host_info)
+        )
         
         return {
             'gpu': gpu_info,
@@ -146,13 +264,14 @@ class TAOLIEHostAgent:
         """Register GPU with central server."""
         # Check if already registered
         gpu_status = await get_gpu_status()
+        self.last_gpu_status = gpu_status
         if gpu_status and gpu_status.get('gpu_uuid'):
             self.gpu_uuid = gpu_status['gpu_uuid']
             logger.info(f"Already registered with UUID: {self.gpu_uuid}")
             return
         
-        # Collect comprehensive system info
-        comp_info = get_comprehensive_system_info()
+        # Collect comprehensive system info (blocking probes, keep them off the loop)
+        comp_info = await asyncio.to_thread(get_comprehensive_system_info)
         
         # Prepare comprehensive registration payload
         payload = {
@@ -220,12 +339,7 @@ class TAOLIEHostAgent:
             
             # Update config with GPU UUID
             self.config['gpu']['uuid'] = self.gpu_uuid
-            config_path = "/etc/taolie-host-agent/config.yaml"
-            if not os.path.exists(config_path):
-                config_path = "config.yaml"
-            
-            with open(config_path, 'w') as f:
-                yaml.dump(self.config, f, default_flow_style=False)
+            await asyncio.to_thread(save_config, self.config)
             
             logger.info(f"Registration successful: {self.gpu_uuid}")
         else:
@@ -235,57 +349,82 @@ class TAOLIEHostAgent:
         """Check for and cleanup orphaned deployments from previous crashes."""
         try:
             active_deployments = await get_expired_deployments()
+            if not active_deployments:
+                return
+            
+            # Look up every deployment container and its state in a single listing
+            result = await asyncio.to_thread(
+                subprocess.run,
+                ['docker', 'ps', '-a', '--filter', 'name=deployment-',
+                 '--format', '{{.Names}}\t{{.State}}'],
+                capture_output=True, text=True, timeout=10
+            )
+            
+            states = dict(
+                line.split('\t', 1) for line in result.stdout.splitlines() if '\t' in line
+            )
+            
+            to_remove = []
+            failed = []
             for deployment in active_deployments:
                 logger.info(f"Found orphaned deployment: {deployment['deployment_id']}")
+                container_name = f"deployment-{deployment['deployment_id']}"
                 
-                # Check if container still exists
-                import subprocess
-                result = subprocess.run(
-                    ['docker', 'ps', '-a', '--filter', f'name={deployment["deployment_id"]}'],
-                    capture_output=True, text=True, timeout=10
-                )
-                
-                if deployment['deployment_id'] in result.stdout:
-                    # Container exists, check if running
-                    running_result = subprocess.run(
-                        ['docker', 'inspect', deployment['deployment_id'], '--format', '{{.State.Running}}'],
-                        capture_output=True, text=True, timeout=10
-                    )
-                    
-                    if running_result.stdout.strip() == 'true':
+                if container_name in states:
+                    if states[container_name] == 'running':
                         logger.info(f"Resuming monitoring: {deployment['deployment_id']}")
                     else:
                         # Container stopped, clean up
-                        subprocess.run(['docker', 'rm', deployment['deployment_id']], timeout=30)
-                        await update_deployment_status(deployment['deployment_id'], 'failed')
-                        logger.info(f"Cleaned up stopped container: {deployment['deployment_id']}")
+                        to_remove.append(container_name)
+                        failed.append(deployment['deployment_id'])
+                        logger.info(f"Cleaning up stopped container: {deployment['deployment_id']}")
                 else:
                     # Container doesn't exist
-                    await update_deployment_status(deployment['deployment_id'], 'failed')
+                    failed.append(deployment['deployment_id'])
                     logger.info(f"Marked as failed: {deployment['deployment_id']}")
+            
+            # One docker rm for all stopped containers, one UPDATE for all failed rows
+            if to_remove:
+                await asyncio.to_thread(subprocess.run, ['docker', 'rm', *to_remove], timeout=60)
+            await bulk_update_deployment_status(failed, 'failed')
                     
         except Exception as e:
             logger.error(f"Error in orphaned deployment cleanup: {e}")
     
     async def start_monitoring_threads(self):
-        """Start all 7 monitoring threads."""
+        """Start all 7 monitoring jobs on a shared scheduler."""
         threads = [
-            ("GPU Monitoring", start_gpu_monitoring, self.config['monitoring']['metrics_push_interval']),
-            ("GPU Health Check", start_health_monitoring, self.config['monitoring']['health_push_interval']),
-            ("Heartbeat", start_heartbeat, self.config['monitoring']['heartbeat_interval']),
-            ("Command Polling", start_command_polling, self.config['monitoring']['command_poll_interval']),
-            ("Metrics Push", start_metrics_push, self.config['monitoring']['metrics_push_interval']),
-            ("Health Push", start_health_push, self.config['monitoring']['health_push_interval']),
-            ("Duration Monitor", start_duration_monitor, self.config['monitoring']['duration_check_interval'])
+            ("GPU Monitoring", tick_gpu_monitoring, self.config['monitoring']['metrics_push_interval']),
+            ("GPU Health Check", tick_health_monitoring, self.config['monitoring']['health_push_interval']),
+            ("Heartbeat", tick_heartbeat, self.config['monitoring']['heartbeat_interval']),
+            ("Command Polling", tick_command_polling, self.config['monitoring']['command_poll_interval']),
+            ("Metrics Push", tick_metrics_push, self.config['monitoring']['metrics_push_interval']),
+            ("Health Push", tick_health_push, self.config['monitoring']['health_push_interval']),
+            ("Duration Monitor", tick_duration_monitor, self.config['monitoring']['duration_check_interval'])
         ]
         
+        # Jobs whose readings rarely change on an idle host slow down until they do.
+        # With batched telemetry the metrics push also carries the heartbeats, so it keeps its pace.
+        adaptive = {tick_gpu_monitoring, tick_health_push}
+        if not batching_enabled(self.config):
+            adaptive.add(tick_metrics_push)
+        stretch = max(int(self.config['monitoring'].get('idle_stretch_factor', 8)), 1)
+        
+        self.scheduler = MonitorScheduler(self.config, self.agent_id)
         for name, func, interval in threads:
-            asyncio.create_task(func(self.config, self.agent_id, interval))
-            logger.info(f"{name} thread started")
+            max_interval = interval * stretch if func in adaptive else interval
+            self.scheduler.add(name, func, interval, max_interval)
+            if max_interval > interval:
+                logger.info(f"{name} job scheduled every {interval}s (up to {max_interval}s while idle)")
+            else:
+                logger.info(f"{name} job scheduled every {interval}s")
+        
+        self.scheduler_task = asyncio.create_task(self.scheduler.run())
     
-    async def generate_dashboard_html(self):
-        """Generate HTML dashboard file."""
-        gpu_status = await get_gpu_status()
+    async def generate_dashboard_html(self, gpu_status: Dict[str, Any] = None):
+        """Generate HTML dashboard file (from gpu_status if the caller already has it)."""
+        if gpu_status is None:
+            gpu_status = await get_gpu_status()
         gpu_name = gpu_status.get('gpu_name', 'Unknown') if gpu_status else 'Unknown'
         vram = gpu_status.get('total_vram_mb', 0) if gpu_status else 0
         driver = gpu_status.get('driver_version', 'Unknown') if gpu_status else 'Unknown'
@@ -444,61 +583,60 @@ class TAOLIEHostAgent:
         dashboard_path = '/var/www/taolie-dashboard.html'
         try:
             os.makedirs(os.path.dirname(dashboard_path), exist_ok=True)
-            with open(dashboard_path, 'w') as f:
-                f.write(html_content)
-            logger.info(f"Dashboard generated: {dashboard_path}")
+            write_dashboard(dashboard_path, html_content)
         except Exception as e:
             logger.warning(f"Could not write dashboard to {dashboard_path}: {e}")
             # Fallback to current directory
-            dashboard_path = 'taolie-dashboard.html'
-            with open(dashboard_path, 'w') as f:
-                f.write(html_content)
-            logger.info(f"Dashboard generated: {dashboard_path}")
+            write_dashboard('taolie-dashboard.html', html_content)
     
     async def print_startup_banner(self):
         """Print simple startup information and generate HTML dashboard."""
-        gpu_status = await get_gpu_status()
+        # A locked gpu_status row must not hold up going online
+        try:
+            gpu_status = await asyncio.wait_for(get_gpu_status(), timeout=BANNER_STATUS_TIMEOUT)
+            self.last_gpu_status = gpu_status
+        except asyncio.TimeoutError:
+            logger.debug("get_gpu_status timed out; using last snapshot for the banner")
+            gpu_status = self.last_gpu_status
         gpu_name = gpu_status.get('gpu_name', 'Unknown') if gpu_status else 'Unknown'
         vram = gpu_status.get('total_vram_mb', 0) if gpu_status else 0
         driver = gpu_status.get('driver_version', 'Unknown') if gpu_status else 'Unknown'
         cuda = gpu_status.get('cuda_version', 'Unknown') if gpu_status else 'Unknown'
         
-        # Generate HTML dashboard
-        await self.generate_dashboard_html()
-        
-        # Print simple banner
-        print("\n" + "="*80)
-        print("TAOLIE HOST AGENT")
-        print("="*80)
-        
-        print("\n[Agent Information]")
-        print(f"  Agent ID:  {self.agent_id}")
-        print(f"  GPU UUID:  {self.gpu_uuid or 'Not registered'}")
-        print(f"  Status:    ONLINE")
+        # Generate HTML dashboard from the same status row
+        await self.generate_dashboard_html(gpu_status or {})
         
-        print("\n[GPU Configuration]")
-        print(f"  Model:     {gpu_name}")
-        print(f"  VRAM:      {vram // 1024} GB ({vram} MB)")
-        print(f"  Driver:    {driver}")
-        print(f"  CUDA:      {cuda}")
-        
-        print("\n[Network Configuration]")
-        print(f"  Public IP:      {self.config['network']['public_ip']}")
-        print(f"  SSH Port:       {self.config['network']['ports']['ssh']}")
-        print(f"  Rental Port 1:  {self.config['network']['ports']['rental_port_1']}")
-        print(f"  Rental Port 2:  {self.config['network']['ports']['rental_port_2']}")
-        
-        print("\n[Monitoring Services]")
-        print("  ✓ GPU Monitoring")
-        print("  ✓ Health Checks")
-        print("  ✓ Heartbeat")
-        print("  ✓ Command Polling")
-        print("  ✓ Metrics Push")
-        print("  ✓ Duration Monitor")
-        
-        print("\n" + "="*80)
-        print("All systems operational - Ready to accept GPU rental requests!")
-        print("="*80 + "\n")
+        # Print simple banner in one write so concurrent log lines cannot split it
+        banner = [
+            "\n" + "="*80,
+            "TAOLIE HOST AGENT",
+            "="*80,
+            "\n[Agent Information]",
+            f"  Agent ID:  {self.agent_id}",
+            f"  GPU UUID:  {self.gpu_uuid or 'Not registered'}",
+            f"  Status:    ONLINE",
+            "\n[GPU Configuration]",
+            f"  Model:     {gpu_name}",
+            f"  VRAM:      {vram // 1024} GB ({vram} MB)",
+            f"  Driver:    {driver}",
+            f"  CUDA:      {cuda}",
+            "\n[Network Configuration]",
+            f"  Public IP:      {self.config['network']['public_ip']}",
+            f"  SSH Port:       {self.config['network']['ports']['ssh']}",
+            f"  Rental Port 1:  {self.config['network']['ports']['rental_port_1']}",
+            f"  Rental Port 2:  {self.config['network']['ports']['rental_port_2']}",
+            "\n[Monitoring Services]",
+            "  ✓ GPU Monitoring",
+            "  ✓ Health Checks",
+            "  ✓ Heartbeat",
+            "  ✓ Command Polling",
+            "  ✓ Metrics Push",
+            "  ✓ Duration Monitor",
+            "\n" + "="*80,
+            "All systems operational - Ready to accept GPU rental requests!",
+            "="*80 + "\n"
+        ]
+        print("\n".join(banner), flush=True)
     
     async def start(self):
         """Main startup sequence."""
@@ -511,18 +649,19 @@ class TAOLIEHostAgent:
             # Step 2: Validate configuration
             self.validate_config()
             
-            # Step 3: Test network configuration
-            await self.test_network_config()
+            # Step 3: Generate or load agent ID
+            await self.generate_agent_id()
             
-            # Step 4: Connect to PostgreSQL
-            await init_database()
+            # Steps 4-6: Test network configuration, connect to PostgreSQL and
+            # collect GPU information concurrently (none depends on another).
+            # If one fails the others are cancelled and finished before stop()
+            # tears down, so init_database can't open a pool after it closed.
+            _, _, system_info = await gather_or_cancel(
+                self.test_network_config(),
+                init_database(),
+                self.collect_system_info()
+            )
             logger.info("Database initialized successfully")
-            
-            # Step 5: Generate or load agent ID
-            self.generate_agent_id()
-            
-            # Step 6: Collect GPU information
-            system_info = await self.collect_system_info()
             logger.info(f"GPU: {system_info['gpu']['name']}")
             logger.info(f"VRAM: {system_info['gpu']['memory_mb']} MB")
             
@@ -544,9 +683,15 @@ class TAOLIEHostAgent:
             self.running = True
             logger.info("TAOLIE Host Agent started successfully")
             
-            # Keep the main thread alive
-            while self.running:
-                await asyncio.sleep(1)
+            # Sleep until SIGTERM/SIGINT (or stop()) asks us to shut down
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                try:
+                    loop.add_signal_handler(sig, self.stop_event.set)
+                except NotImplementedError:
+                    pass  # Windows: Ctrl+C still arrives as KeyboardInterrupt
+            await self.stop_event.wait()
+            logger.info("Received shutdown signal")
                 
         except Exception as e:
             logger.error(f"Failed to start TAOLIE Host Agent: {e}")
@@ -556,7 +701,16 @@ class TAOLIEHostAgent:
         """Stop the agent gracefully."""
         logger.info("Stopping TAOLIE Host Agent...")
         self.running = False
+        self.stop_event.set()
+        # Stop scheduling new ticks and cancel the ones in flight
+        if self.scheduler_task is not None:
+            self.scheduler_task.cancel()
+            await asyncio.gather(self.scheduler_task, return_exceptions=True)
+            await self.scheduler.shutdown()
+        # Write out any buffered GPU metrics before the pool goes away
+        await flush_gpu_metrics()
         await cleanup_database()
+        await close_session()
         logger.info("TAOLIE Host Agent stopped")
 
 async def main():
@@ -574,4 +728,7 @@ async def main():
         await agent.stop()
 
 if __name__ == "__main__":
+    # libuv-based loop when available (not on Windows); stock asyncio otherwise
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
\ No newline at end of file